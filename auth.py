@@ -14,27 +14,39 @@ author/owner, is strictly prohibited.
 For inquiries, contact: nicolas7cunderlik@gmail.com
 """
 
-import spotipy
-from openai import OpenAI
-from spotipy.oauth2 import SpotifyOAuth
-
-# Sensitive information
-auth_vars = {}
-with open("venv/auth.env", 'r') as file:
-    for line in file:
-        line = line.strip()
-        if not line or line.startswith('#'):
-            continue
-        key, value = line.split('=', 1)
-        auth_vars[key.strip()] = value.strip()
-        
-SPOTIPY_CLIENT_ID = auth_vars.get('SPOTIPY_CLIENT_ID')
-SPOTIPY_CLIENT_SECRET = auth_vars.get('SPOTIPY_CLIENT_SECRET')
-SPOTIPY_REDIRECT_URI = auth_vars.get('SPOTIPY_REDIRECT_URI')
-OPENAI_API_KEY = auth_vars.get('OPENAI_API_KEY')
+import functools
+
+AUTH_FILE = "venv/auth.env"
+_AUTH_KEYS = ('SPOTIPY_CLIENT_ID', 'SPOTIPY_CLIENT_SECRET', 'SPOTIPY_REDIRECT_URI', 'OPENAI_API_KEY')
+
+# Sensitive information, read from AUTH_FILE on first use rather than at
+# import, so importing this module (and the app's startup) stays cheap.
+@functools.lru_cache(maxsize=None)
+def load_auth_vars():
+    """
+    Parses AUTH_FILE (KEY=value lines, # comments) into a dict.
+
+    Returns:
+        The parsed variables; the file is only read once.
+    """
+    auth_vars = {}
+    with open(AUTH_FILE, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            key, value = line.split('=', 1)
+            auth_vars[key.strip()] = value.strip()
+    return auth_vars
+
+def __getattr__(name):
+    # Keeps auth.SPOTIPY_CLIENT_ID etc. working as module attributes.
+    if name in _AUTH_KEYS:
+        return load_auth_vars().get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Spotify authentication and client setup
-def getSpotifyClient():
+def getSpotifyClient(requests_session=None):
     """
     Returns a Spotify client object for interacting with the Spotify API.
 
@@ -42,18 +54,30 @@ def getSpotifyClient():
     specified by the SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET, and
     SPOTIPY_REDIRECT_URI environment variables, respectively.
 
-    The client will use the "user-read-playback-state" scope, allowing
-    it to read the user's currently playing track.
+    The client will use the "user-read-playback-state" and
+    "user-read-currently-playing" scopes, allowing it to read the user's
+    currently playing track and upcoming queue.
+
+    Args:
+        requests_session: Optional requests.Session to send API and token
+            requests through (so connections are pooled and reused).
 
     Returns:
         A Spotify client object.
     """
-    scope = "user-read-playback-state"
-    sp_oauth = SpotifyOAuth(client_id=SPOTIPY_CLIENT_ID,
-                            client_secret=SPOTIPY_CLIENT_SECRET,
-                            redirect_uri=SPOTIPY_REDIRECT_URI,
-                            scope=scope)
-    return spotipy.Spotify(auth_manager=sp_oauth)
+    # spotipy and openai are slow to import, so only on first client creation.
+    import spotipy
+    from spotipy.oauth2 import SpotifyOAuth
+
+    auth_vars = load_auth_vars()
+    scope = "user-read-playback-state user-read-currently-playing"
+    sp_oauth = SpotifyOAuth(client_id=auth_vars.get('SPOTIPY_CLIENT_ID'),
+                            client_secret=auth_vars.get('SPOTIPY_CLIENT_SECRET'),
+                            redirect_uri=auth_vars.get('SPOTIPY_REDIRECT_URI'),
+                            scope=scope,
+                            requests_session=requests_session or True)
+    return spotipy.Spotify(auth_manager=sp_oauth,
+                           requests_session=requests_session or True)
 
 def getOpenAIClient():
     """
@@ -62,6 +86,8 @@ def getOpenAIClient():
     Returns:
         The OpenAI API key as a string.
     """
+    from openai import OpenAI
+
     return OpenAI(
-        api_key=OPENAI_API_KEY
+        api_key=load_auth_vars().get('OPENAI_API_KEY')
     )
\ No newline at end of file
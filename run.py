@@ -1,16 +1,21 @@
 """Entry point for the refactored Spotistats app.
 Run with: python run.py
 """
+import time
+_START = time.perf_counter()  # before the imports below, which are part of startup time
+
 import sys
 import logging
 import pywinstyles
 from PyQt5.QtWidgets import QApplication
+from spotistats.utils import startup
 from spotistats.ui.main_window import SpotifyApp
 
 # logging is configured by spotistats.utils.logging_config on import
 logger = logging.getLogger(__name__)
 
 if __name__ == '__main__':
+    startup.begin(_START)
     app = QApplication(sys.argv)
     window = SpotifyApp()
     pywinstyles.apply_style(window, "dark")
@@ -2,5 +2,49 @@ import os
 
 # Feature flags and global settings
 LOG_FILE = os.environ.get("SPOTISTATS_LOG_FILE", "spotistats.log")
+LOG_LEVEL = os.environ.get("SPOTISTATS_LOG_LEVEL", "INFO")
+LOG_MAX_BYTES = int(os.environ.get("SPOTISTATS_LOG_MAX_BYTES", str(1024 * 1024)))  # rotate at this size
+LOG_BACKUP_COUNT = int(os.environ.get("SPOTISTATS_LOG_BACKUP_COUNT", "5"))  # gzipped rotations kept
+# Per-logger levels, e.g. SPOTISTATS_LOGGER_LEVELS="spotistats=DEBUG,spotipy=DEBUG"
+LOGGER_LEVELS = {
+    "spotistats": "DEBUG",
+    "spotipy": "WARNING",
+    "urllib3": "WARNING",
+    "openai": "WARNING",
+    "httpx": "WARNING",
+    "httpcore": "WARNING",
+}
+LOGGER_LEVELS.update(
+    item.strip().split("=", 1) for item in os.environ.get("SPOTISTATS_LOGGER_LEVELS", "").split(",") if "=" in item
+)
 WORKER_TIMEOUT = int(os.environ.get("WORKER_TIMEOUT", "15"))
+WORKER_THREADS = int(os.environ.get("WORKER_THREADS", "4"))  # shared pool for per-track fetch stages
 APP_TITLE = os.environ.get("SPOTISTATS_APP_TITLE", "Spotistats")
+
+# Timing/counter instrumentation (see utils/metrics.py)
+METRICS_ENABLED = os.environ.get("SPOTISTATS_METRICS", "1") != "0"
+# If set, metrics are written here on exit (.prom for Prometheus text, otherwise JSON)
+METRICS_EXPORT = os.environ.get("SPOTISTATS_METRICS_EXPORT", "")
+
+# Persistent caches (see services/cache.py)
+CACHE_DB = os.environ.get("SPOTISTATS_CACHE_DB", "spotistats_cache.db")
+AI_CACHE_MAX_ENTRIES = int(os.environ.get("AI_CACHE_MAX_ENTRIES", "5000"))
+AI_CACHE_TTL = int(os.environ.get("AI_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+IMAGE_CACHE_MEMORY_BYTES = int(os.environ.get("IMAGE_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+IMAGE_CACHE_DISK_BYTES = int(os.environ.get("IMAGE_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+PIXMAP_CACHE_SIZE = int(os.environ.get("PIXMAP_CACHE_SIZE", "64"))  # rendered 260px covers kept in memory
+
+# Shared HTTP session (see services/http.py)
+HTTP_POOL_HOSTS = int(os.environ.get("HTTP_POOL_HOSTS", "4"))  # distinct hosts kept pooled
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "8"))  # connections kept per host
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "3"))
+HTTP_BACKOFF = float(os.environ.get("HTTP_BACKOFF", "0.3"))  # seconds, doubled per retry
+
+# Upcoming tracks whose art/AI/similar results are fetched ahead (0 disables)
+PREFETCH_DEPTH = int(os.environ.get("PREFETCH_DEPTH", "2"))
+
+# OpenAI request scheduling (see services/ai_service.py)
+AI_RATE_PER_MIN = float(os.environ.get("AI_RATE_PER_MIN", "20"))
+AI_BURST = int(os.environ.get("AI_BURST", "5"))
+AI_MAX_RETRIES = int(os.environ.get("AI_MAX_RETRIES", "3"))
+AI_BACKOFF = float(os.environ.get("AI_BACKOFF", "1.0"))  # seconds, doubled per retry (jittered)
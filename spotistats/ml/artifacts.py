@@ -0,0 +1,85 @@
+"""Flat binary array artifacts that the live app opens with np.memmap.
+
+joblib pickles have to be fully deserialized into private heap memory by every
+process that loads them. These files are instead a small JSON header followed
+by the raw C-order array bytes, so a reader maps them straight from the OS
+page cache: opening one is near-instant, pages are only faulted in when
+touched, and several processes reading the same file share those pages.
+
+Layout:
+    8 bytes   magic (MAGIC)
+    4 bytes   header length, little-endian uint32
+    n bytes   UTF-8 JSON header - dtype, shape, plus any writer metadata
+    padding   zeros up to the next ALIGNMENT-byte boundary
+    data      raw array bytes
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"SPSTARR1"
+ALIGNMENT = 64
+
+FEATURES_FILE = "features.f32"
+NEIGHBOR_IDS_FILE = "neighbors.i32"
+NEIGHBOR_SIMS_FILE = "neighbors.f16"
+IVF_CENTROIDS_FILE = "ivf_centroids.f32"
+IVF_ROWS_FILE = "ivf_rows.i32"
+IVF_OFFSETS_FILE = "ivf_offsets.i64"
+CODES_FILE = "codes.q"
+CODEBOOK_FILE = "codebook.f32"
+TRACK_META_FILE = "track_meta.csv"
+SEGMENTS_DIR = "segments"
+
+
+def write_array(path, array, **meta):
+    """Write `array` to `path` with `meta` stored in the header.
+
+    `meta` must be JSON-serializable. The file is written to a temporary
+    name and renamed into place, so a concurrent reader never sees a
+    half-written artifact.
+    """
+    array = np.ascontiguousarray(array)
+    header = dict(meta, dtype=array.dtype.str, shape=list(array.shape))
+    header_bytes = json.dumps(header).encode("utf-8")
+    prefix_len = len(MAGIC) + 4 + len(header_bytes)
+    padding = -prefix_len % ALIGNMENT
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * padding)
+        f.write(array.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_header(path):
+    """Return (header, data_offset) for the artifact at `path`."""
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a Spotistats array artifact")
+        (header_len,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    prefix_len = len(MAGIC) + 4 + header_len
+    return header, prefix_len + (-prefix_len % ALIGNMENT)
+
+
+def open_array(path, mode="r"):
+    """Memory-map the artifact at `path` and return (array, header).
+
+    The returned array is read-only by default; nothing is copied into
+    process memory until rows are actually read.
+    """
+    header, offset = read_header(path)
+    dtype = np.dtype(header["dtype"])
+    shape = tuple(header["shape"])
+    if 0 in shape:
+        # mmap refuses zero-length mappings.
+        return np.empty(shape, dtype=dtype), header
+    array = np.memmap(path, dtype=dtype, mode=mode, offset=offset, shape=shape)
+    return array, header
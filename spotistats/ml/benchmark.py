@@ -0,0 +1,231 @@
+"""Benchmarks the ML pipeline on synthetic catalogs and saves the results as JSON.
+
+For each catalog size, a synthetic playlist CSV is generated once (see
+data/generate_synthetic.py) and these steps are measured:
+
+- load_catalog: features.load_catalog, CSV parse + dedupe
+- build_feature_matrix: features.build_feature_matrix on the loaded catalog
+- train: train.train from the CSV with a cold catalog cache
+- model_load: SimilarityModel.__init__ over the trained artifacts
+- find_similar: single-track lookups answered by the neighbor table
+- find_similar_live: lookups for more neighbors than the table holds, so
+  they run a live index search
+
+Steps can be picked with --steps; model_load and the lookup steps need
+trained artifacts, so without the train step they're trained first (untimed)
+unless the workdir already has them.
+
+Each step runs in a fresh process, so its peak RSS is its own (that peak
+includes the step's setup, e.g. the catalog that build_feature_matrix is
+given). Lookup steps also report latency percentiles.
+
+Results are written with the git commit and library versions to a JSON file.
+Passing an earlier file to --compare prints per-step ratios against it. No
+network access is needed.
+
+Run: python -m spotistats.ml.benchmark [--sizes 30k,1M] [--index ivf] [--compare old.json]
+
+The exact index's precomputed neighbor table costs O(n^2) to build, so use
+--index ivf for the 1M and 10M sizes.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import artifacts
+from .data import generate_synthetic
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_SIZES = "30k"
+N_QUERIES = 1000
+STEPS = ["load_catalog", "build_feature_matrix", "train", "model_load", "find_similar", "find_similar_live"]
+NEEDS_ARTIFACTS = {"model_load", "find_similar", "find_similar_live"}
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _latency_ms(seconds):
+    p50, p95, p99 = np.percentile(np.asarray(seconds) * 1000, [50, 95, 99])
+    return {"p50": p50, "p95": p95, "p99": p99}
+
+
+def _run_step(step, csv_path, artifact_dir, cache_dir, index_type, n_queries, seed):
+    """Run one step in this (fresh) process and return its measurements."""
+    from . import features, train
+    from .similarity_model import SimilarityModel
+
+    result = {}
+    if step == "load_catalog":
+        start = time.perf_counter()
+        catalog = features.load_catalog(csv_path)
+        result["seconds"] = time.perf_counter() - start
+        result["unique_tracks"] = len(catalog)
+    elif step == "build_feature_matrix":
+        catalog = features.load_catalog(csv_path)
+        start = time.perf_counter()
+        features.build_feature_matrix(catalog)
+        result["seconds"] = time.perf_counter() - start
+    elif step == "train":
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        start = time.perf_counter()
+        train.train(index_type=index_type, csv_path=csv_path, artifact_dir=artifact_dir, cache_dir=cache_dir)
+        result["seconds"] = time.perf_counter() - start
+    elif step == "model_load":
+        start = time.perf_counter()
+        SimilarityModel(artifact_dir)
+        result["seconds"] = time.perf_counter() - start
+    else:
+        model = SimilarityModel(artifact_dir)
+        k = 3 if step == "find_similar" else train.NEIGHBOR_TABLE_K + 1
+        rng = np.random.default_rng(seed)
+        track_ids = [model.track_ids[i] for i in rng.integers(0, len(model.track_ids), n_queries)]
+        model.find_similar(track_ids[0], k=k)  # first-touch page faults aren't steady-state latency
+        seconds = np.empty(len(track_ids))
+        for i, track_id in enumerate(track_ids):
+            start = time.perf_counter()
+            model.find_similar(track_id, k=k)
+            seconds[i] = time.perf_counter() - start
+        result["seconds"] = float(seconds.sum())
+        result["k"] = k
+        result["queries"] = len(track_ids)
+        result["latency_ms"] = _latency_ms(seconds)
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=10,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(sizes, workdir, index_type="exact", dup=generate_synthetic.DEFAULT_DUP, steps=STEPS,
+        n_queries=N_QUERIES, seed=0):
+    """Benchmark `steps` at each size (row counts) and return the results document."""
+    import pandas
+    import sklearn
+
+    doc = {
+        "commit": _git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pandas.__version__,
+        "sklearn": sklearn.__version__,
+        "cpus": os.cpu_count(),
+        "index": index_type,
+        "dup": dup,
+        "results": [],
+    }
+    ctx = multiprocessing.get_context("spawn")
+    for n_rows in sizes:
+        csv_path = os.path.join(workdir, f"synthetic_{n_rows}_{dup}_{seed}.csv")
+        if not os.path.exists(csv_path):
+            print(f"Generating {n_rows} rows -> {csv_path}")
+            generate_synthetic.generate(n_rows, csv_path, dup=dup, seed=seed)
+        artifact_dir = os.path.join(workdir, f"artifacts_{n_rows}_{index_type}")
+        cache_dir = os.path.join(workdir, f"cache_{n_rows}")
+
+        if ("train" not in steps and NEEDS_ARTIFACTS.intersection(steps)
+                and not os.path.exists(os.path.join(artifact_dir, artifacts.FEATURES_FILE))):
+            print(f"Training {n_rows}-row artifacts for {', '.join(s for s in steps if s in NEEDS_ARTIFACTS)} (untimed)")
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                pool.submit(_run_step, "train", csv_path, artifact_dir, cache_dir,
+                            index_type, n_queries, seed).result()
+
+        for step in steps:
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                result = pool.submit(_run_step, step, csv_path, artifact_dir, cache_dir,
+                                     index_type, n_queries, seed).result()
+            result.update(rows=n_rows, step=step)
+            doc["results"].append(result)
+            line = f"{n_rows:>10d} rows  {step:22s} {result['seconds']:9.3f}s"
+            if result["peak_rss_mb"] is not None:
+                line += f"  peak RSS {result['peak_rss_mb']:8.1f} MB"
+            if "latency_ms" in result:
+                lat = result["latency_ms"]
+                line += f"  p50={lat['p50']:.3f}ms p95={lat['p95']:.3f}ms p99={lat['p99']:.3f}ms"
+            print(line, flush=True)
+    return doc
+
+
+def compare(doc, baseline):
+    """Print this run's time/RSS/p95 as ratios of `baseline`'s (> 1 is slower/bigger)."""
+    old = {(r["rows"], r["step"]): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('created')}):")
+    for r in doc["results"]:
+        prev = old.get((r["rows"], r["step"]))
+        if prev is None:
+            continue
+        parts = [f"time x{r['seconds'] / prev['seconds']:.2f}" if prev["seconds"] else "time n/a"]
+        if r.get("peak_rss_mb") and prev.get("peak_rss_mb"):
+            parts.append(f"RSS x{r['peak_rss_mb'] / prev['peak_rss_mb']:.2f}")
+        if "latency_ms" in r and "latency_ms" in prev and prev["latency_ms"]["p95"]:
+            parts.append(f"p95 x{r['latency_ms']['p95'] / prev['latency_ms']['p95']:.2f}")
+        print(f"{r['rows']:>10d} rows  {r['step']:22s} " + "  ".join(parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated row counts, e.g. 30k,1M,10M")
+    parser.add_argument("--dup", type=float, default=generate_synthetic.DEFAULT_DUP,
+                        help="average CSV rows per unique track")
+    parser.add_argument("--index", default="exact", choices=("exact", "ivf"))
+    parser.add_argument("--steps", default=",".join(STEPS), help="comma-separated subset of: " + ", ".join(STEPS))
+    parser.add_argument("--queries", type=int, default=N_QUERIES, help="lookups timed per lookup step")
+    parser.add_argument("--workdir", default=None,
+                        help="where synthetic CSVs and artifacts go; reused across runs (default: a temp dir)")
+    parser.add_argument("--out", default=None, help="results JSON (default: benchmark-<commit>.json)")
+    parser.add_argument("--compare", default=None, help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    sizes = [generate_synthetic.parse_size(s) for s in args.sizes.split(",")]
+    steps = [s for s in args.steps.split(",") if s]
+    unknown = set(steps) - set(STEPS)
+    if unknown:
+        parser.error(f"unknown steps: {', '.join(sorted(unknown))}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="spotistats-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        doc = run(sizes, workdir, index_type=args.index, dup=args.dup, steps=steps, n_queries=args.queries)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    out_path = args.out or f"benchmark-{(doc['commit'] or 'unknown')[:10]}.json"
+    with open(out_path, "w") as f:
+        json.dump(doc, f, indent=2)
+    print(f"\nResults written to {out_path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(doc, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""On-disk columnar cache of the deduplicated catalog.
+
+train.py and evaluate.py both start from features.load_catalog, which parses
+and aggregates the raw playlist CSV every run. This caches its output as one
+.npy file per column (no extra dependency, and no pickling: text columns are
+stored dictionary-encoded as int32 codes plus a fixed-width unicode array of
+the distinct values).
+
+The cache is keyed by the source CSV's size, mtime and SHA-256. Size and
+mtime are checked first; only if they changed is the file re-hashed, so an
+untouched CSV costs a stat() and a content-identical rewrite (e.g. a fresh
+download of the same data) refreshes the key instead of rebuilding.
+
+By default the cache lives in a .catalog_cache directory next to the CSV it
+was built from (git-ignored), never inside the package itself unless the
+CSV is there too.
+
+Run python -m spotistats.ml.catalog_cache to (re)build the cache ahead of time.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from . import features
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+CACHE_DIR = None  # None: CACHE_DIR_NAME next to the source CSV
+CACHE_DIR_NAME = ".catalog_cache"
+CSV_PATH = os.path.join(DATA_DIR, "spotify_songs.csv")
+
+CACHE_VERSION = 1  # bump when load_catalog's output changes shape or meaning
+MANIFEST_FILE = "manifest.json"
+DERIVED_COLUMNS = ["key_sin", "key_cos"]
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def default_cache_dir(csv_path):
+    return os.path.join(os.path.dirname(os.path.abspath(csv_path)), CACHE_DIR_NAME)
+
+
+def _cache_path(csv_path, cache_dir):
+    if cache_dir is None:
+        cache_dir = default_cache_dir(csv_path)
+    # Name by basename for readability, disambiguated by the source's location.
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    location = hashlib.sha1(os.path.abspath(csv_path).encode("utf-8")).hexdigest()[:8]
+    return os.path.join(cache_dir, f"{name}-{location}")
+
+
+def _read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _is_fresh(manifest, csv_path, path, include_derived):
+    """Return True if `manifest` describes a usable cache of `csv_path`."""
+    if manifest is None or manifest.get("version") != CACHE_VERSION:
+        return False
+    if include_derived and not manifest.get("derived"):
+        return False
+    source = manifest["source"]
+    stat = os.stat(csv_path)
+    if stat.st_size == source["size"] and stat.st_mtime_ns == source["mtime_ns"]:
+        return True
+    if stat.st_size != source["size"] or file_sha256(csv_path) != source["sha256"]:
+        return False
+    # Same bytes, new mtime: refresh the key so the next check is a stat() again.
+    source["mtime_ns"] = stat.st_mtime_ns
+    with open(os.path.join(path, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f)
+    return True
+
+
+def _write_cache(catalog, csv_path, path, include_derived):
+    stat = os.stat(csv_path)
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    columns = []
+    for i, name in enumerate(catalog.columns):
+        col = catalog[name]
+        if pd.api.types.is_numeric_dtype(col):
+            np.save(os.path.join(tmp_path, f"{i}.npy"), col.to_numpy())
+            columns.append({"name": name, "kind": "numeric"})
+        else:
+            codes, uniques = pd.factorize(col)
+            np.save(os.path.join(tmp_path, f"{i}.codes.npy"), codes.astype(np.int32))
+            np.save(os.path.join(tmp_path, f"{i}.values.npy"), np.asarray(uniques, dtype=str))
+            columns.append({"name": name, "kind": "text"})
+
+    manifest = {
+        "version": CACHE_VERSION,
+        "derived": include_derived,
+        "source": {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_sha256(csv_path)},
+        "columns": columns,
+    }
+    with open(os.path.join(tmp_path, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def _read_cache(path, manifest):
+    data = {}
+    for i, column in enumerate(manifest["columns"]):
+        if column["kind"] == "numeric":
+            data[column["name"]] = np.load(os.path.join(path, f"{i}.npy"))
+        else:
+            codes = np.load(os.path.join(path, f"{i}.codes.npy"))
+            uniques = np.load(os.path.join(path, f"{i}.values.npy")).astype(object)
+            values = uniques[codes] if len(uniques) else np.full(len(codes), np.nan, dtype=object)
+            values[codes < 0] = np.nan
+            data[column["name"]] = pd.Series(values)
+    return pd.DataFrame(data)
+
+
+def load_catalog(csv_path=CSV_PATH, cache_dir=CACHE_DIR, include_derived=False):
+    """Cached equivalent of features.load_catalog(csv_path).
+
+    With `include_derived`, the returned catalog also carries the circular
+    key columns from features.add_derived_columns, computed once and cached
+    alongside the rest. A missing, stale or unreadable cache is rebuilt from
+    the CSV transparently.
+    """
+    path = _cache_path(csv_path, cache_dir)
+    manifest = _read_manifest(path)
+    if _is_fresh(manifest, csv_path, path, include_derived):
+        try:
+            catalog = _read_cache(path, manifest)
+            if not include_derived:
+                catalog = catalog.drop(columns=DERIVED_COLUMNS, errors="ignore")
+            return catalog
+        except Exception:
+            logger.exception("Catalog cache at %s is unreadable, rebuilding", path)
+
+    catalog = features.load_catalog(csv_path)
+    if include_derived:
+        catalog = features.add_derived_columns(catalog)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_cache(catalog, csv_path, path, include_derived)
+    except OSError:
+        logger.exception("Failed to write catalog cache to %s", path)
+    return catalog
+
+
+if __name__ == "__main__":
+    catalog = load_catalog(include_derived=True)
+    print(f"Cached {len(catalog)} unique tracks under {_cache_path(CSV_PATH, CACHE_DIR)}")
@@ -0,0 +1,156 @@
+"""Generates synthetic playlist CSVs with the TidyTuesday "Spotify Songs" schema.
+
+For benchmarking the pipeline (see benchmark.py) at catalog sizes the real
+dataset (~33k rows) doesn't reach. Like the real file it's a playlist/track
+join table: `--dup` is the average number of rows per unique track (the real
+data has ~1.16), and duplicate rows of a track repeat its audio features
+exactly while their playlist columns differ.
+
+Every value is a hash of (seed, track or row number, column), so rows are
+generated in fixed-size chunks with memory independent of the row count, and
+the same arguments always produce the same file.
+
+Run: python -m spotistats.ml.data.generate_synthetic 1M [--dup 1.16] [--out path.csv]
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = [
+    "track_id", "track_name", "track_artist", "track_popularity", "track_album_id",
+    "track_album_name", "track_album_release_date", "playlist_name", "playlist_id",
+    "playlist_genre", "playlist_subgenre", "danceability", "energy", "key", "loudness",
+    "mode", "speechiness", "acousticness", "instrumentalness", "liveness", "valence",
+    "tempo", "duration_ms",
+]
+GENRES = np.array(["edm", "latin", "pop", "r&b", "rap", "rock"])
+SUBGENRES = np.array(["classic", "hip", "indie", "modern", "post", "progressive", "urban", "electro"])
+DEFAULT_DUP = 1.16
+CHUNK_ROWS = 500_000
+TRACKS_PER_ARTIST = 10
+TRACKS_PER_ALBUM = 8
+_BASE62 = np.array(list("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"))
+
+_MASK = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _mix(x):
+    """splitmix64 finalizer: a well-scrambled uint64 for every uint64 input."""
+    with np.errstate(over="ignore"):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return (x ^ (x >> np.uint64(31))) & _MASK
+
+
+def _uniform(ids, seed, column):
+    """Deterministic uniform [0, 1) values, one per id, independent across columns."""
+    with np.errstate(over="ignore"):
+        key = np.asarray(ids, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15) + np.uint64(seed * 1000 + column)
+    return (_mix(key) >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def _spotify_ids(ids, seed, salt):
+    """22-character base62 ids (like Spotify's), unique per (id, salt)."""
+    with np.errstate(over="ignore"):
+        # _mix is a bijection, and 11 base62 digits hold any uint64, so the
+        # first half alone is already unique; the second half is filler.
+        x = _mix(np.asarray(ids, dtype=np.uint64) * np.uint64(4) + np.uint64(salt))
+        y = _mix(x ^ np.uint64(seed + 1))
+    digits = []
+    for word in (x, y):
+        for _ in range(11):
+            digits.append(word % np.uint64(62))
+            word = word // np.uint64(62)
+    codes = np.stack(digits, axis=1).astype(np.int64)
+    return pd.Series(_BASE62[codes].view("<U22").ravel())
+
+
+def _audio_features(tracks, seed):
+    u = [_uniform(tracks, seed, c) for c in range(12)]
+    return {
+        "danceability": np.round(0.2 + 0.75 * u[0], 3),
+        "energy": np.round(u[1] ** 0.7, 3),
+        "key": (u[2] * 12).astype(np.int8),
+        "loudness": np.round(-25 + 24 * u[3] ** 0.4, 3),
+        "mode": (u[4] < 0.57).astype(np.int8),
+        "speechiness": np.round(0.02 + 0.4 * u[5] ** 3, 4),
+        "acousticness": np.round(u[6] ** 2.5, 5),
+        "instrumentalness": np.round(np.where(u[7] < 0.6, 0.0, u[7] ** 6), 6),
+        "liveness": np.round(0.03 + 0.6 * u[8] ** 3, 4),
+        "valence": np.round(u[9], 3),
+        "tempo": np.round(70 + 110 * u[10], 3),
+        "duration_ms": (120_000 + 240_000 * u[11]).astype(np.int32),
+    }
+
+
+def generate_chunk(start, stop, n_unique, seed=0):
+    """Rows [start, stop) of the synthetic table as a DataFrame."""
+    rows = np.arange(start, stop, dtype=np.int64)
+    # The first n_unique rows introduce each track once; the rest repeat random ones.
+    repeat_pick = (_uniform(rows, seed, 100) * n_unique).astype(np.int64)
+    tracks = np.where(rows < n_unique, rows, repeat_pick)
+    playlists = (_uniform(rows, seed, 101) * max(n_unique // 50, 1)).astype(np.int64)
+
+    # A track's playlists mostly agree on its genre, as in the real data.
+    track_genre = (_uniform(tracks, seed, 102) * len(GENRES)).astype(np.int64)
+    row_genre = (_uniform(rows, seed, 103) * len(GENRES)).astype(np.int64)
+    genre = np.where(_uniform(rows, seed, 104) < 0.9, track_genre, row_genre)
+
+    artists = tracks // TRACKS_PER_ARTIST
+    albums = tracks // TRACKS_PER_ALBUM
+    year = 1960 + (_uniform(albums, seed, 105) * 60).astype(np.int64)
+    data = {
+        "track_id": _spotify_ids(tracks, seed, 1),
+        "track_name": pd.Series(tracks).map("Track {}".format),
+        "track_artist": pd.Series(artists).map("Artist {}".format),
+        "track_popularity": (_uniform(tracks, seed, 106) * 100).astype(np.int64),
+        "track_album_id": _spotify_ids(albums, seed, 2),
+        "track_album_name": pd.Series(albums).map("Album {}".format),
+        "track_album_release_date": pd.Series(year).astype(str) + "-01-01",
+        "playlist_name": pd.Series(playlists).map("Playlist {}".format),
+        "playlist_id": _spotify_ids(playlists, seed, 3),
+        "playlist_genre": GENRES[genre],
+        "playlist_subgenre": SUBGENRES[(_uniform(rows, seed, 107) * len(SUBGENRES)).astype(np.int64)],
+    }
+    data.update(_audio_features(tracks, seed))
+    return pd.DataFrame(data, columns=COLUMNS)
+
+
+def generate(n_rows, out_path, dup=DEFAULT_DUP, seed=0, chunk_rows=CHUNK_ROWS):
+    """Write an `n_rows`-row synthetic CSV to `out_path`; returns the number of unique tracks."""
+    n_unique = max(1, min(n_rows, int(round(n_rows / dup))))
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        for start in range(0, n_rows, chunk_rows):
+            chunk = generate_chunk(start, min(start + chunk_rows, n_rows), n_unique, seed)
+            chunk.to_csv(f, header=start == 0, index=False)
+    os.replace(tmp_path, out_path)
+    return n_unique
+
+
+def parse_size(text):
+    """'30k' -> 30000, '1M' -> 1000000, '10m' -> 10000000, '2500' -> 2500."""
+    text = text.strip()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:].lower(), 1)
+    digits = text[:-1] if scale != 1 else text
+    return int(float(digits) * scale)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("rows", help="number of rows, e.g. 30k, 1M, 10M")
+    parser.add_argument("--dup", type=float, default=DEFAULT_DUP, help="average rows per unique track (>= 1)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="output CSV (default: data/synthetic_<rows>.csv)")
+    args = parser.parse_args()
+
+    n_rows = parse_size(args.rows)
+    out_path = args.out or os.path.join(os.path.dirname(__file__), f"synthetic_{args.rows}.csv")
+    n_unique = generate(n_rows, out_path, dup=args.dup, seed=args.seed)
+    print(f"Wrote {n_rows} rows ({n_unique} unique tracks) to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,63 +1,269 @@
-"""Evaluation: holds out a stratified test split and measures how well kNN
+"""Evaluation: holds out stratified test folds and measures how well kNN
 retrieval recovers genre as a proxy for "are the neighbors actually similar".
 
 Compares the named feature variants from features.py so feature selection is
-driven by measured accuracy, not an assumed feature count.
+driven by measured accuracy, not an assumed feature count. Each variant is
+scored over stratified k-fold splits (optionally repeated with different
+seeds) and reported as mean/std accuracy; variants x folds run in parallel on
+a process pool, and the neighbor vote is vectorized over all test rows.
 
-Run: python -m spotistats.ml.evaluate
+`--mode ann` instead measures the approximate IVF index against exact search
+over the full catalog: recall@k (fraction of the exact top-k it also returns)
+and single-query latency for each n_probe, so the speed/accuracy trade-off
+passed to train.py comes from measured numbers.
+
+`--mode quant` compares quantized vector storage (int8, product
+quantization), with and without exact re-ranking, against float32: recall@k
+versus exact search, leave-one-out genre accuracy of the top-k vote, bytes per
+stored vector and single-query latency.
+
+Run: python -m spotistats.ml.evaluate [--folds 5 --repeats 2 --jobs 4]
+     python -m spotistats.ml.evaluate --mode ann [--n-probe 1,4,16]
+     python -m spotistats.ml.evaluate --mode quant [--rerank 4]
 """
+import argparse
 import os
-from collections import Counter
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-from sklearn.model_selection import train_test_split
-from sklearn.neighbors import NearestNeighbors
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import RepeatedStratifiedKFold, train_test_split
 
-from . import features
+from . import catalog_cache, features, knn, quantization
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 CSV_PATH = os.path.join(DATA_DIR, "spotify_songs.csv")
 
 K_VALUES = (1, 3, 5)
+N_FOLDS = 5
+N_REPEATS = 1
+ANN_N_PROBES = (1, 2, 4, 8, 16, 32)
+ANN_K = 10
+ANN_QUERIES = 1000
+QUANT_RERANK = 4
+
+
+def majority_vote(neighbor_codes, n_classes):
+    """Most common class per row of `neighbor_codes` (n, k), nearest-first on ties.
+
+    Equivalent to Counter(row).most_common(1) for every row (whose ties go to
+    the class seen first, i.e. the nearer neighbor), but done with a single
+    offset np.bincount over all rows.
+    """
+    n, k = neighbor_codes.shape
+    flat = neighbor_codes + n_classes * np.arange(n)[:, None]
+    counts = np.bincount(flat.ravel(), minlength=n * n_classes).reshape(n, n_classes)
+    first_seen = np.full((n, n_classes), k)
+    rows = np.arange(n)
+    for j in reversed(range(k)):
+        first_seen[rows, neighbor_codes[:, j]] = j
+    return np.argmax(counts * (k + 1) - first_seen, axis=1)
+
+
+def evaluate_split(store, genre_codes, variant, train_idx, test_idx, k_values=K_VALUES):
+    """Return {k: accuracy} for one train/test split given as row positions into `store`."""
+    X_train, scaler = store.feature_matrix(variant, rows=train_idx)
+    X_test, _ = store.feature_matrix(variant, rows=test_idx, scaler=scaler)
+
+    index = knn.CosineIndex(knn.normalize_rows(X_train))
+    indices, _ = index.search(knn.normalize_rows(X_test), max(k_values))
+
+    neighbor_codes = genre_codes[train_idx][indices]
+    test_codes = genre_codes[test_idx]
+    n_classes = int(genre_codes.max()) + 1
+    return {
+        k: float(np.mean(majority_vote(neighbor_codes[:, :k], n_classes) == test_codes))
+        for k in k_values
+    }
 
 
 def evaluate_variant(catalog, variant, k_values=K_VALUES, seed=42):
-    train_df, test_df = train_test_split(
-        catalog, test_size=0.2, random_state=seed, stratify=catalog["playlist_genre"]
+    """Score `variant` on a single stratified 80/20 split."""
+    genre_codes, _ = pd.factorize(catalog["playlist_genre"])
+    train_idx, test_idx = train_test_split(
+        np.arange(len(catalog)), test_size=0.2, random_state=seed, stratify=genre_codes
     )
+    store = features.FeatureStore(catalog)
+    return evaluate_split(store, genre_codes, variant, train_idx, test_idx, k_values)
+
+
+# Per-process state for pool workers, set once by _init_worker so the feature
+# store is pickled to each worker once rather than with every task.
+_worker_store = None
+_worker_codes = None
+
+
+def _init_worker(store, genre_codes):
+    global _worker_store, _worker_codes
+    _worker_store = store
+    _worker_codes = genre_codes
+
+
+def _run_task(variant, train_idx, test_idx, k_values):
+    # Wall-clock timestamps, so spans can be compared across worker processes.
+    start = time.time()
+    results = evaluate_split(_worker_store, _worker_codes, variant, train_idx, test_idx, k_values)
+    return variant, results, start, time.time()
 
-    X_train, scaler = features.build_feature_matrix(train_df, variant=variant)
-    X_test, _ = features.build_feature_matrix(test_df, variant=variant, scaler=scaler)
 
-    max_k = max(k_values)
-    nn = NearestNeighbors(n_neighbors=max_k, metric="cosine")
-    nn.fit(X_train)
+def cross_validate(catalog, variants=None, k_values=K_VALUES, n_folds=N_FOLDS,
+                   n_repeats=N_REPEATS, seed=42, jobs=None):
+    """Score every variant over the same repeated stratified k-fold splits.
 
-    train_genres = train_df["playlist_genre"].to_numpy()
-    test_genres = test_df["playlist_genre"].to_numpy()
+    Returns {variant: {"mean": {k: acc}, "std": {k: acc}, "seconds": wall time
+    from the start of that variant's first fold to the end of its last,
+    "worker_seconds": fold durations summed over workers}}. `jobs` is the process pool size
+    (default: CPU count); jobs=1 runs everything in-process.
+    """
+    variants = list(variants or features.FEATURE_VARIANTS)
+    store = features.FeatureStore(catalog)
+    genre_codes, _ = pd.factorize(catalog["playlist_genre"])
+    splitter = RepeatedStratifiedKFold(n_splits=n_folds, n_repeats=n_repeats, random_state=seed)
+    splits = list(splitter.split(np.zeros(len(catalog)), genre_codes))
+    tasks = [(variant, train_idx, test_idx, k_values)
+             for variant in variants for train_idx, test_idx in splits]
 
-    _, indices = nn.kneighbors(X_test)
+    if jobs == 1:
+        _init_worker(store, genre_codes)
+        outcomes = [_run_task(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(store, genre_codes)) as pool:
+            outcomes = list(pool.map(_run_task, *zip(*tasks)))
 
-    results = {}
-    for k in k_values:
-        correct = 0
-        for i, neighbor_idx in enumerate(indices[:, :k]):
-            predicted = Counter(train_genres[neighbor_idx]).most_common(1)[0][0]
-            if predicted == test_genres[i]:
-                correct += 1
-        results[k] = correct / len(test_df)
-    return results
+    summary = {}
+    for variant in variants:
+        runs = [(results, start, end) for v, results, start, end in outcomes if v == variant]
+        scores = np.array([[results[k] for k in k_values] for results, _, _ in runs])
+        summary[variant] = {
+            "mean": dict(zip(k_values, scores.mean(axis=0))),
+            "std": dict(zip(k_values, scores.std(axis=0))),
+            "seconds": max(end for _, _, end in runs) - min(start for _, start, _ in runs),
+            "worker_seconds": sum(end - start for _, start, end in runs),
+        }
+    return summary
+
+
+def _time_queries(search, queries, k, exclude):
+    """Run queries one at a time (as the app does) and return (ids, per-query seconds)."""
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    seconds = np.empty(len(queries))
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        ids[i] = search(queries[i:i + 1], k, exclude=exclude[i:i + 1])[0][0]
+        seconds[i] = time.perf_counter() - start
+    return ids, seconds
+
+
+def evaluate_ann(catalog, variant=features.DEFAULT_VARIANT, n_lists=None, n_probes=ANN_N_PROBES,
+                 k=ANN_K, n_queries=ANN_QUERIES, seed=42):
+    """Return one row per index configuration: (label, recall@k, p50 ms, p95 ms).
+
+    Queries are catalog tracks (excluding themselves from their results),
+    matching how SimilarityModel is used.
+    """
+    X, _ = features.FeatureStore(catalog).feature_matrix(variant)
+    X = knn.normalize_rows(X)
+    rng = np.random.default_rng(seed)
+    query_rows = rng.choice(len(X), min(n_queries, len(X)), replace=False)
+    queries = X[query_rows]
+
+    exact_ids, exact_seconds = _time_queries(knn.CosineIndex(X).search, queries, k, query_rows)
+    rows = [("exact", 1.0, *np.percentile(exact_seconds * 1000, [50, 95]))]
+
+    start = time.perf_counter()
+    ivf = knn.IVFIndex.build(X, n_lists=n_lists, seed=seed)
+    print(f"IVF build: {len(ivf.centroids)} lists in {time.perf_counter() - start:.1f}s")
+
+    for n_probe in n_probes:
+        def search(q, k, exclude, n_probe=n_probe):
+            return ivf.search(q, k, exclude=exclude, n_probe=n_probe)
+        ann_ids, ann_seconds = _time_queries(search, queries, k, query_rows)
+        recall = np.mean([
+            len(np.intersect1d(a, e)) / k for a, e in zip(ann_ids, exact_ids)
+        ])
+        rows.append((f"ivf n_probe={n_probe}", recall, *np.percentile(ann_seconds * 1000, [50, 95])))
+    return rows
+
+
+def evaluate_quantization(catalog, variant=features.DEFAULT_VARIANT, k=ANN_K, n_queries=ANN_QUERIES,
+                          rerank=QUANT_RERANK, seed=42):
+    """Return one row per storage configuration:
+    (label, bytes per vector, recall@k, genre accuracy, p50 ms, p95 ms).
+    """
+    X, _ = features.FeatureStore(catalog).feature_matrix(variant)
+    X = knn.normalize_rows(X)
+    genre_codes, _ = pd.factorize(catalog["playlist_genre"])
+    n_classes = int(genre_codes.max()) + 1
+    rng = np.random.default_rng(seed)
+    query_rows = rng.choice(len(X), min(n_queries, len(X)), replace=False)
+    queries = X[query_rows]
+    exact_ids, _ = knn.CosineIndex(X).search(queries, k, exclude=query_rows)
+
+    configs = [("float32", knn.CosineIndex(X), X.shape[1] * X.itemsize)]
+    for name, codec_cls in quantization.CODECS.items():
+        codec = codec_cls.train(X)
+        bytes_per_vector = codec.codes.shape[1] * codec.codes.itemsize
+        configs.append((name, knn.CosineIndex(X, codec=codec), bytes_per_vector))
+        if rerank:
+            configs.append((f"{name} rerank x{rerank}", knn.CosineIndex(X, codec=codec, rerank=rerank),
+                            bytes_per_vector))
+
+    rows = []
+    for label, index, bytes_per_vector in configs:
+        ids, seconds = _time_queries(index.search, queries, k, query_rows)
+        recall = np.mean([len(np.intersect1d(a, e)) / k for a, e in zip(ids, exact_ids)])
+        accuracy = np.mean(majority_vote(genre_codes[ids], n_classes) == genre_codes[query_rows])
+        rows.append((label, bytes_per_vector, recall, accuracy, *np.percentile(seconds * 1000, [50, 95])))
+    return rows
 
 
 def main():
-    catalog = features.load_catalog(CSV_PATH)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", default="genre", choices=("genre", "ann", "quant"))
+    parser.add_argument("--folds", type=int, default=N_FOLDS, help="genre: stratified folds per repeat")
+    parser.add_argument("--repeats", type=int, default=N_REPEATS, help="genre: k-fold repeats with different seeds")
+    parser.add_argument("--jobs", type=int, default=None, help="genre: worker processes (default: CPU count)")
+    parser.add_argument("--variant", default=features.DEFAULT_VARIANT, choices=sorted(features.FEATURE_VARIANTS),
+                        help="ann/quant: feature variant to index")
+    parser.add_argument("--n-lists", type=int, default=None, help="ann: IVF bucket count (default 4*sqrt(n))")
+    parser.add_argument("--n-probe", default=",".join(map(str, ANN_N_PROBES)),
+                        help="ann: comma-separated n_probe values to sweep")
+    parser.add_argument("--k", type=int, default=ANN_K, help="ann/quant: neighbors per query for recall@k")
+    parser.add_argument("--queries", type=int, default=ANN_QUERIES, help="ann/quant: number of sampled query tracks")
+    parser.add_argument("--rerank", type=int, default=QUANT_RERANK, help="quant: re-rank factor to compare (0 skips)")
+    args = parser.parse_args()
+
+    catalog = catalog_cache.load_catalog(CSV_PATH)
+    if args.mode == "ann":
+        n_probes = [int(p) for p in args.n_probe.split(",")]
+        print(f"Catalog: {len(catalog)} unique tracks, variant '{args.variant}', "
+              f"recall@{args.k} over {min(args.queries, len(catalog))} queries\n")
+        for label, recall, p50, p95 in evaluate_ann(catalog, args.variant, args.n_lists, n_probes,
+                                                    args.k, args.queries):
+            print(f"{label:20s} recall={recall:.3f} p50={p50:.3f}ms p95={p95:.3f}ms")
+        return
+    if args.mode == "quant":
+        print(f"Catalog: {len(catalog)} unique tracks, variant '{args.variant}', "
+              f"recall@{args.k} over {min(args.queries, len(catalog))} queries\n")
+        for label, size, recall, accuracy, p50, p95 in evaluate_quantization(
+                catalog, args.variant, args.k, args.queries, args.rerank):
+            print(f"{label:20s} {size:3d} B/vec recall={recall:.3f} genre-acc={accuracy:.3f} "
+                  f"p50={p50:.3f}ms p95={p95:.3f}ms")
+        return
+
     print(f"Catalog: {len(catalog)} unique tracks across {catalog['playlist_genre'].nunique()} genres")
     print(f"Genre baseline (always predict most common genre): "
           f"{catalog['playlist_genre'].value_counts(normalize=True).iloc[0]:.3f}\n")
 
-    for variant in features.FEATURE_VARIANTS:
-        results = evaluate_variant(catalog, variant)
-        scores = ", ".join(f"top-{k}={acc:.3f}" for k, acc in results.items())
-        print(f"{variant:30s} {scores}")
+    start = time.perf_counter()
+    summary = cross_validate(catalog, n_folds=args.folds, n_repeats=args.repeats, jobs=args.jobs)
+    for variant, result in summary.items():
+        scores = ", ".join(f"top-{k}={result['mean'][k]:.3f}\u00b1{result['std'][k]:.3f}" for k in K_VALUES)
+        print(f"{variant:30s} {scores}  ({result['seconds']:.1f}s wall, {result['worker_seconds']:.1f}s worker)")
+    print(f"\n{args.folds}-fold x {args.repeats} cross-validation finished in "
+          f"{time.perf_counter() - start:.1f}s wall time")
 
 
 if __name__ == "__main__":
@@ -8,6 +8,12 @@ instead. It's encoded as (sin, cos) of its position on the 12-tone circle.
 
 Feature sets are named variants rather than a fixed count - which columns
 actually help is an empirical question, answered by evaluate.py.
+
+Derived columns are registered in DERIVED_FEATURES (name -> input columns and
+a function of them). FeatureStore materializes a catalog's feature columns
+once into a single float32 block and computes derived ones lazily, the first
+time a variant needs them, so sweeping variants and splits doesn't re-copy
+the catalog or recompute sin/cos every time.
 """
 import numpy as np
 import pandas as pd
@@ -44,6 +50,28 @@ FEATURE_VARIANTS = {
 DEFAULT_VARIANT = "circular_key_with_duration"
 
 
+# Only these columns are read from the source CSV. Continuous features stay
+# float64 so the catalog is value-identical to a default-dtype parse; the
+# integer-valued ones and the genre label get compact dtypes. Text columns
+# keep pandas' default string handling.
+CATALOG_COLUMNS = ["track_id", "track_name", "track_artist", "playlist_genre"] + RAW_AUDIO_COLUMNS
+CATALOG_DTYPES = {
+    "playlist_genre": "category",
+    "danceability": "float64",
+    "energy": "float64",
+    "key": "int8",
+    "loudness": "float64",
+    "mode": "int8",
+    "speechiness": "float64",
+    "acousticness": "float64",
+    "instrumentalness": "float64",
+    "liveness": "float64",
+    "valence": "float64",
+    "tempo": "float64",
+    "duration_ms": "int32",
+}
+
+
 def load_catalog(csv_path):
     """Load the raw playlist-track CSV and collapse it to one row per unique track.
 
@@ -51,29 +79,136 @@ def load_catalog(csv_path):
     appear many times under different playlists (and occasionally different
     playlist_genre tags). Audio features are intrinsic to the track, so the
     first occurrence is kept; the genre label (used only for evaluation) is
-    taken as the most frequent tag across that track's occurrences.
+    taken as the most frequent tag across that track's occurrences, ties
+    going to the alphabetically first tag (as Series.mode() would).
+
+    Everything is vectorized: the majority genre comes from one
+    groupby().size() pass over (track, genre) pairs rather than a per-group
+    Python mode(), which dominated load time on duplicate-heavy dumps.
     """
-    df = pd.read_csv(csv_path)
+    df = pd.read_csv(csv_path, usecols=CATALOG_COLUMNS, dtype=CATALOG_DTYPES)
     df = df.dropna(subset=["track_name", "track_artist"])
 
-    agg = {col: "first" for col in RAW_AUDIO_COLUMNS}
-    agg["track_name"] = "first"
-    agg["track_artist"] = "first"
-    agg["playlist_genre"] = lambda s: s.mode().iat[0]
+    first_cols = RAW_AUDIO_COLUMNS + ["track_name", "track_artist"]
+    catalog = df.groupby("track_id")[first_cols].first()
+
+    # Categories are parsed in sorted order, so ascending codes break count
+    # ties alphabetically.
+    genre_counts = (
+        df.groupby(["track_id", "playlist_genre"], observed=True, sort=False)
+        .size()
+        .reset_index(name="count")
+    )
+    genre_counts["code"] = genre_counts["playlist_genre"].cat.codes
+    majority = (
+        genre_counts.sort_values(["count", "code"], ascending=[False, True], kind="stable")
+        .drop_duplicates("track_id")
+        .set_index("track_id")["playlist_genre"]
+    )
+    catalog["playlist_genre"] = majority.reindex(catalog.index).astype(df["track_name"].dtype)
+
+    return catalog.reset_index()
+
+
+def _key_sin(key):
+    return np.sin(key * (2 * np.pi / 12))
+
+
+def _key_cos(key):
+    return np.cos(key * (2 * np.pi / 12))
 
-    catalog = df.groupby("track_id").agg(agg).reset_index()
-    return catalog
+
+# name -> (input column names, function of those columns as float arrays).
+# Functions must be module-level (not lambdas) so a FeatureStore can be
+# pickled to evaluation worker processes.
+DERIVED_FEATURES = {
+    "key_sin": (("key",), _key_sin),
+    "key_cos": (("key",), _key_cos),
+}
+
+
+def register_derived(name, inputs, func):
+    """Register a derived feature computed as `func(*input_columns)`."""
+    DERIVED_FEATURES[name] = (tuple(inputs), func)
 
 
 def add_derived_columns(catalog):
-    """Return a copy of `catalog` with the circular key encoding columns added."""
+    """Return a copy of `catalog` with every registered derived column added."""
     catalog = catalog.copy()
-    radians = catalog["key"].astype(float) * (2 * np.pi / 12)
-    catalog["key_sin"] = np.sin(radians)
-    catalog["key_cos"] = np.cos(radians)
+    for name, (inputs, func) in DERIVED_FEATURES.items():
+        catalog[name] = func(*(catalog[col].astype(float) for col in inputs))
     return catalog
 
 
+class FeatureStore:
+    """Every raw and derived feature column of a catalog in one float32 block.
+
+    Storage is column-major, so `column(name)` is a contiguous view and
+    nothing is copied until a variant's standardized matrix is built. Derived
+    columns get a slot up front but are only computed when first requested.
+    """
+
+    def __init__(self, catalog, derived=None):
+        self.derived = dict(DERIVED_FEATURES if derived is None else derived)
+        self.columns = list(RAW_AUDIO_COLUMNS) + [c for c in self.derived if c not in RAW_AUDIO_COLUMNS]
+        self._position = {name: i for i, name in enumerate(self.columns)}
+        self.data = np.empty((len(catalog), len(self.columns)), dtype=np.float32, order="F")
+        self.data[:, :len(RAW_AUDIO_COLUMNS)] = catalog[RAW_AUDIO_COLUMNS].to_numpy(dtype=np.float32)
+        self._ready = set(RAW_AUDIO_COLUMNS)
+        self._scalers = {}
+
+    def __len__(self):
+        return len(self.data)
+
+    def register(self, name, inputs, func):
+        """Add a derived feature to this store only; computed lazily like the rest."""
+        self.derived[name] = (tuple(inputs), func)
+        self._ready.discard(name)
+        self._scalers.clear()
+        if name not in self._position:
+            grown = np.empty((len(self.data), len(self.columns) + 1), dtype=np.float32, order="F")
+            grown[:, :-1] = self.data
+            self.data = grown
+            self._position[name] = len(self.columns)
+            self.columns.append(name)
+
+    def column(self, name):
+        """Return the float32 view of one feature column, computing it if derived."""
+        i = self._position[name]
+        if name not in self._ready:
+            inputs, func = self.derived[name]
+            self.data[:, i] = func(*(self.column(col) for col in inputs))
+            self._ready.add(name)
+        return self.data[:, i]
+
+    def raw(self, variant, rows=None):
+        """Unscaled (n, n_columns) float32 matrix of `variant`'s columns, optionally for a row subset."""
+        columns = FEATURE_VARIANTS[variant]
+        for name in columns:
+            self.column(name)
+        positions = [self._position[name] for name in columns]
+        if rows is None:
+            return self.data[:, positions]
+        return self.data[np.ix_(np.asarray(rows), positions)]
+
+    def scaler(self, variant):
+        """StandardScaler fit on all rows for `variant`, fit once and reused."""
+        if variant not in self._scalers:
+            self._scalers[variant] = StandardScaler().fit(self.raw(variant))
+        return self._scalers[variant]
+
+    def feature_matrix(self, variant=DEFAULT_VARIANT, rows=None, scaler=None):
+        """Store-backed equivalent of build_feature_matrix, returning (X, scaler).
+
+        With `rows` and no `scaler`, a new scaler is fit on just those rows
+        (e.g. a train split); pass it back in for the matching test rows.
+        """
+        raw = self.raw(variant, rows)
+        if scaler is None:
+            scaler = self.scaler(variant) if rows is None else StandardScaler().fit(raw)
+        return scaler.transform(raw), scaler
+
+
 def build_feature_matrix(catalog, variant=DEFAULT_VARIANT, scaler=None):
     """Build a standardized feature matrix for the given variant.
 
@@ -81,15 +216,8 @@ def build_feature_matrix(catalog, variant=DEFAULT_VARIANT, scaler=None):
     returned. Otherwise the provided (already-fit) scaler is reused, e.g.
     fit on a train split then applied to a held-out test split to avoid
     leaking test statistics into the normalization.
-    """
-    catalog = add_derived_columns(catalog)
-    columns = FEATURE_VARIANTS[variant]
-    raw = catalog[columns].to_numpy(dtype=float)
-
-    if scaler is None:
-        scaler = StandardScaler()
-        X = scaler.fit_transform(raw)
-    else:
-        X = scaler.transform(raw)
 
-    return X, scaler
+    One-off convenience wrapper; build a FeatureStore directly when
+    computing several variants or splits over the same catalog.
+    """
+    return FeatureStore(catalog).feature_matrix(variant, scaler=scaler)
@@ -0,0 +1,330 @@
+"""Cosine top-k search in plain NumPy: an exact index and an IVF approximation.
+
+Cosine similarity between L2-normalized rows is just a dot product, so a block
+of queries against the whole catalog is one matrix multiply followed by an
+argpartition - no per-query metric dispatch. Blocks are sized so the
+(block x catalog) similarity matrix stays within BLOCK_BYTES regardless of
+catalog size.
+
+Exact search is linear in catalog size per query, which is fine for the ~28k
+TidyTuesday tracks but not for millions. IVFIndex clusters the catalog with
+spherical k-means and only scans the `n_probe` clusters closest to each
+query; evaluate.py --mode ann measures the recall it gives up for that.
+
+Index types are registered in INDEX_TYPES by name. Each provides
+build(vectors, **params), load(artifact_dir, vectors), save(artifact_dir),
+search(queries, k, exclude=None), and for segment compaction (segments.py)
+extended(vectors) and rebuilt(vectors).
+
+Either index can score candidates from a quantized copy of the vectors
+instead of the float matrix by passing a `codec` (see quantization.py); with
+`rerank` > 0 it then takes k * rerank approximate candidates and re-ranks
+them with exact float dot products before returning the top k. Search results are (ids, similarities)
+arrays of shape (n_queries, k); an approximate index can come up short, in
+which case the missing slots hold id -1.
+"""
+import os
+
+import numpy as np
+
+from . import artifacts
+
+BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def normalize_rows(X):
+    """Return a float32 copy of `X` with every row scaled to unit L2 norm.
+
+    All-zero rows are left as zeros rather than becoming NaN.
+    """
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return X / norms
+
+
+def block_rows_for(n_base, block_bytes=BLOCK_BYTES):
+    """Number of query rows whose similarities against `n_base` rows fit in `block_bytes`."""
+    return max(1, block_bytes // (4 * max(n_base, 1)))
+
+
+def top_k_block(sims, k):
+    """Return (indices, similarities) of the `k` largest entries of each row of `sims`, best first."""
+    k = min(k, sims.shape[1])
+    if k == 0:
+        return (np.empty((sims.shape[0], 0), dtype=np.int64),
+                np.empty((sims.shape[0], 0), dtype=sims.dtype))
+    part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    part_sims = np.take_along_axis(sims, part, axis=1)
+    order = np.argsort(-part_sims, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_sims, order, axis=1)
+
+
+def rerank_exact(vectors, queries, candidates, k):
+    """Re-score candidate row ids (n_queries, n_candidates) exactly and keep the top `k`.
+
+    Candidate rows are gathered in sorted order, so on a memmap only those
+    pages are read. Padding ids (-1) stay at the end.
+    """
+    valid = candidates >= 0
+    unique_rows, inverse = np.unique(np.where(valid, candidates, 0), return_inverse=True)
+    candidate_vectors = np.asarray(vectors[unique_rows], dtype=np.float32)[inverse.reshape(candidates.shape)]
+    exact = np.einsum("qcd,qd->qc", candidate_vectors, queries)
+    exact[~valid] = -np.inf
+    top, top_sims = top_k_block(exact, k)
+    return np.take_along_axis(candidates, top, axis=1), top_sims
+
+
+class CosineIndex:
+    """Exact cosine search over a matrix of L2-normalized float32 rows.
+
+    `vectors` may be a read-only memmap; it is never copied. Queries must be
+    normalized the same way (see normalize_rows). With a `codec`, the scan
+    reads its quantized codes instead, so the result is no longer exact
+    unless re-ranked.
+    """
+
+    name = "exact"
+
+    def __init__(self, vectors, block_bytes=BLOCK_BYTES, codec=None, rerank=0):
+        self.vectors = vectors
+        self.block_bytes = block_bytes
+        self.codec = codec
+        self.rerank = rerank
+
+    @classmethod
+    def build(cls, vectors, codec=None, rerank=0):
+        return cls(vectors, codec=codec, rerank=rerank)
+
+    @classmethod
+    def load(cls, artifact_dir, vectors, codec=None, rerank=0):
+        return cls(vectors, codec=codec, rerank=rerank)
+
+    def save(self, artifact_dir):
+        pass  # nothing beyond the feature artifact itself
+
+    def rebuilt(self, vectors):
+        """A fresh index of the same type and settings over `vectors`."""
+        return self.extended(vectors)
+
+    def extended(self, vectors):
+        """Index over `vectors`, whose leading len(self) rows are the ones already indexed."""
+        codec = self.codec.extended(vectors) if self.codec is not None else None
+        return type(self)(vectors, self.block_bytes, codec, self.rerank)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, queries, k, exclude=None):
+        """Return (ids, similarities) of the top-`k` rows for each query, best first.
+
+        `exclude`, if given, holds one row id per query that must not be
+        returned for it (typically the query track's own row; -1 for none).
+        A row is always its own best match, so masking it is more reliable
+        than asking for k + 1 and dropping the first - exact duplicates can
+        outrank it.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        n_queries = len(queries)
+        available = len(self.vectors) - (1 if exclude is not None else 0)
+        k = max(min(k, available), 0)
+        n_candidates = k
+        if self.codec is not None and self.rerank:
+            n_candidates = min(k * self.rerank, available)
+        ids = np.empty((n_queries, k), dtype=np.int64)
+        sims = np.empty((n_queries, k), dtype=np.float32)
+        step = block_rows_for(len(self.vectors), self.block_bytes)
+        for start in range(0, n_queries, step):
+            stop = min(start + step, n_queries)
+            if self.codec is not None:
+                block = self.codec.scores(queries[start:stop])
+            else:
+                block = queries[start:stop] @ self.vectors.T
+            if exclude is not None:
+                rows = np.arange(stop - start)
+                cols = np.asarray(exclude[start:stop])
+                valid = cols >= 0
+                block[rows[valid], cols[valid]] = -np.inf
+            block_ids, block_sims = top_k_block(block, n_candidates)
+            if n_candidates > k:
+                block_ids, block_sims = rerank_exact(self.vectors, queries[start:stop], block_ids, k)
+            ids[start:stop], sims[start:stop] = block_ids, block_sims
+        return ids, sims
+
+
+def spherical_kmeans(X, n_clusters, n_iter=20, sample_size=None, seed=0):
+    """Cluster the unit-norm rows of `X` by cosine similarity; returns normalized centroids.
+
+    Fit on a random sample of `sample_size` rows (default: 256 per cluster),
+    which is plenty for coarse partitioning and keeps training time flat as
+    the catalog grows.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(X)
+    n_clusters = min(n_clusters, n)
+    sample_size = min(n, sample_size or 256 * n_clusters)
+    sample = np.asarray(X[np.sort(rng.choice(n, sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assign = CosineIndex(centroids).search(sample, 1)[0][:, 0]
+        counts = np.bincount(assign, minlength=n_clusters)
+        sums = np.stack(
+            [np.bincount(assign, weights=sample[:, j], minlength=n_clusters)
+             for j in range(sample.shape[1])],
+            axis=1,
+        )
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters from random points so no list is wasted.
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file approximate cosine index.
+
+    Rows are bucketed by their nearest k-means centroid; `list_rows` holds
+    row ids grouped by bucket and `list_offsets[c]:list_offsets[c + 1]` is
+    bucket c's slice of it. A query scores only the rows of its `n_probe`
+    nearest buckets, so cost scales with n_probe / n_lists of the catalog.
+    """
+
+    name = "ivf"
+    DEFAULT_N_PROBE = 8
+
+    def __init__(self, vectors, centroids, list_rows, list_offsets, n_probe=DEFAULT_N_PROBE,
+                 codec=None, rerank=0):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_rows = list_rows
+        self.list_offsets = list_offsets
+        self.n_probe = n_probe
+        self.codec = codec
+        self.rerank = rerank
+        self._coarse = CosineIndex(centroids)
+
+    @classmethod
+    def build(cls, vectors, n_lists=None, n_probe=DEFAULT_N_PROBE, n_iter=20, seed=0, codec=None, rerank=0):
+        n = len(vectors)
+        n_lists = n_lists or max(1, int(4 * np.sqrt(n)))
+        centroids = spherical_kmeans(vectors, n_lists, n_iter=n_iter, seed=seed)
+        assign = CosineIndex(centroids).search(vectors, 1)[0][:, 0]
+        list_rows = np.argsort(assign, kind="stable").astype(np.int32)
+        list_offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=len(centroids)), out=list_offsets[1:])
+        return cls(vectors, centroids, list_rows, list_offsets, n_probe=n_probe, codec=codec, rerank=rerank)
+
+    @classmethod
+    def load(cls, artifact_dir, vectors, codec=None, rerank=0):
+        centroids, header = artifacts.open_array(os.path.join(artifact_dir, artifacts.IVF_CENTROIDS_FILE))
+        list_rows, _ = artifacts.open_array(os.path.join(artifact_dir, artifacts.IVF_ROWS_FILE))
+        list_offsets, _ = artifacts.open_array(os.path.join(artifact_dir, artifacts.IVF_OFFSETS_FILE))
+        return cls(vectors, np.asarray(centroids), list_rows, np.asarray(list_offsets),
+                   n_probe=header.get("n_probe", cls.DEFAULT_N_PROBE), codec=codec, rerank=rerank)
+
+    def save(self, artifact_dir):
+        artifacts.write_array(os.path.join(artifact_dir, artifacts.IVF_CENTROIDS_FILE),
+                              self.centroids, n_probe=self.n_probe)
+        artifacts.write_array(os.path.join(artifact_dir, artifacts.IVF_ROWS_FILE), self.list_rows)
+        artifacts.write_array(os.path.join(artifact_dir, artifacts.IVF_OFFSETS_FILE), self.list_offsets)
+
+    def rebuilt(self, vectors):
+        """A fresh index over `vectors`, re-clustered with the same list count and n_probe."""
+        codec = self.codec.extended(vectors) if self.codec is not None else None
+        return type(self).build(vectors, n_lists=len(self.centroids), n_probe=self.n_probe,
+                                codec=codec, rerank=self.rerank)
+
+    def extended(self, vectors):
+        """Index over `vectors`, whose leading len(self) rows are the ones already indexed.
+
+        New rows are assigned to the existing centroids instead of
+        re-clustering, so the cost is proportional to the number added.
+        """
+        n_lists = len(self.centroids)
+        assign = np.empty(len(vectors), dtype=np.int64)
+        assign[self.list_rows] = np.repeat(np.arange(n_lists), np.diff(self.list_offsets))
+        assign[len(self):] = self._coarse.search(vectors[len(self):], 1)[0][:, 0]
+        list_rows = np.argsort(assign, kind="stable").astype(np.int32)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=n_lists), out=list_offsets[1:])
+        codec = self.codec.extended(vectors) if self.codec is not None else None
+        return type(self)(vectors, self.centroids, list_rows, list_offsets, n_probe=self.n_probe,
+                          codec=codec, rerank=self.rerank)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, queries, k, exclude=None, n_probe=None):
+        """Approximate counterpart of CosineIndex.search; see there for `exclude`.
+
+        `n_probe` overrides the number of buckets scanned per query.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        probes, _ = self._coarse.search(queries, n_probe)
+
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        sims = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for i, query in enumerate(queries):
+            rows = np.concatenate([
+                self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probes[i]
+            ])
+            if exclude is not None:
+                rows = rows[rows != exclude[i]]
+            # Sorted row ids turn the gather into a forward scan of the memmap.
+            rows.sort()
+            if self.codec is not None:
+                row_sims = self.codec.scores(query[None, :], rows)[0]
+            else:
+                row_sims = self.vectors[rows] @ query
+            n_candidates = k * self.rerank if self.codec is not None and self.rerank else k
+            top, top_sims = top_k_block(row_sims[None, :], n_candidates)
+            top = rows[top]
+            if n_candidates > k:
+                top, top_sims = rerank_exact(self.vectors, query[None, :], top, k)
+            ids[i, :top.shape[1]] = top[0]
+            sims[i, :top.shape[1]] = top_sims[0]
+        return ids, sims
+
+
+def merge_top_k(ids_a, sims_a, ids_b, sims_b, k):
+    """Merge two per-query candidate lists into the overall top-`k`, best first.
+
+    Slots with id -1 (padding) never win over a real candidate.
+    """
+    ids = np.concatenate([ids_a, ids_b], axis=1)
+    sims = np.concatenate([sims_a, sims_b], axis=1).astype(np.float32)
+    sims[ids < 0] = -np.inf
+    top, top_sims = top_k_block(sims, k)
+    return np.take_along_axis(ids, top, axis=1), top_sims
+
+
+INDEX_TYPES = {
+    CosineIndex.name: CosineIndex,
+    IVFIndex.name: IVFIndex,
+}
+
+
+def neighbor_table(index, k, block_bytes=BLOCK_BYTES):
+    """Top-`k` cosine neighbor graph of every row in `index`, excluding each row itself.
+
+    Returns (neighbor_ids, similarities) as (n, k) int32 and float16 arrays,
+    best neighbor first. Built with whatever index is passed, so it is exact
+    for CosineIndex and approximate (and much cheaper on large catalogs) for
+    IVFIndex. Processed in row blocks so peak memory stays bounded by
+    `block_bytes` plus one block of results.
+    """
+    vectors = index.vectors
+    n = len(vectors)
+    k = min(k, max(n - 1, 0))
+    ids = np.empty((n, k), dtype=np.int32)
+    sims = np.empty((n, k), dtype=np.float16)
+    step = block_rows_for(n, block_bytes)
+    for start in range(0, n, step):
+        stop = min(start + step, n)
+        block_ids, block_sims = index.search(vectors[start:stop], k, exclude=np.arange(start, stop))
+        ids[start:stop] = block_ids
+        sims[start:stop] = block_sims
+    return ids, sims
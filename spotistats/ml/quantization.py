@@ -0,0 +1,185 @@
+"""Compressed vector storage for the similarity index.
+
+Full-precision float32 vectors cost 4 bytes per dimension. For catalogs of
+tens of millions of tracks, the index can instead scan a quantized copy:
+
+- ScalarQuantizer ("int8"): each dimension is mapped linearly onto 256
+  levels between its min and max - 1 byte per dimension, 4x smaller.
+- ProductQuantizer ("pq"): the dimensions are split into subspaces and each
+  sub-vector is replaced by the id of its nearest of 256 k-means centroids -
+  1 byte per subspace. Queries are scored with asymmetric distance
+  computation: the query stays in float, a (subspace x 256) table of its dot
+  products with every centroid is built once, and a row's score is the sum
+  of its codes' table entries.
+
+Both expose scores(queries, rows=None), an approximation of
+queries @ vectors[rows].T, which knn's indexes use in place of the float
+matmul. Since scores are approximate, an index can re-rank its top
+candidates with exact float dot products (see knn.CosineIndex `rerank`);
+only those candidate rows of the memory-mapped float matrix are then read.
+
+evaluate.py --mode quant measures the recall and genre-accuracy cost of each.
+"""
+import os
+
+import numpy as np
+
+from . import artifacts
+
+CHUNK_ROWS = 65536  # rows decoded/scored at a time, bounding temporary memory
+N_CENTROIDS = 256
+
+
+def _kmeans(X, n_clusters, n_iter=20, seed=0):
+    """Euclidean k-means (Lloyd's) on a small in-memory matrix; returns centroids."""
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(X))
+    centroids = X[rng.choice(len(X), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        dists = (X ** 2).sum(1)[:, None] - 2 * X @ centroids.T + (centroids ** 2).sum(1)[None, :]
+        assign = dists.argmin(axis=1)
+        counts = np.bincount(assign, minlength=n_clusters)
+        for j in range(X.shape[1]):
+            sums = np.bincount(assign, weights=X[:, j], minlength=n_clusters)
+            nonempty = counts > 0
+            centroids[nonempty, j] = sums[nonempty] / counts[nonempty]
+    return centroids
+
+
+class ScalarQuantizer:
+    """Per-dimension linear int8 quantization."""
+
+    name = "int8"
+
+    def __init__(self, low, step, codes=None):
+        self.low = low
+        self.step = step
+        self.codes = codes
+
+    @classmethod
+    def train(cls, vectors):
+        low = vectors.min(axis=0).astype(np.float32)
+        step = ((vectors.max(axis=0) - low) / 255).astype(np.float32)
+        step[step == 0] = 1
+        codec = cls(low, step)
+        codec.codes = codec.encode(vectors)
+        return codec
+
+    def encode(self, vectors):
+        codes = np.empty(vectors.shape, dtype=np.int8)
+        for start in range(0, len(vectors), CHUNK_ROWS):
+            chunk = np.asarray(vectors[start:start + CHUNK_ROWS], dtype=np.float32)
+            levels = np.clip(np.rint((chunk - self.low) / self.step), 0, 255)
+            codes[start:start + CHUNK_ROWS] = levels - 128
+        return codes
+
+    def extended(self, vectors):
+        """Same quantizer with codes for all of `vectors` (no re-fitting)."""
+        return type(self)(self.low, self.step, self.encode(vectors))
+
+    def scores(self, queries, rows=None):
+        codes = self.codes if rows is None else self.codes[rows]
+        # x ~= low + (code + 128) * step, so q.x ~= (q * step).code + q.(low + 128 * step)
+        scaled = queries * self.step
+        bias = queries @ (self.low + 128 * self.step)
+        out = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), CHUNK_ROWS):
+            chunk = np.asarray(codes[start:start + CHUNK_ROWS], dtype=np.float32)
+            out[:, start:start + len(chunk)] = scaled @ chunk.T
+        out += bias[:, None]
+        return out
+
+    def state(self):
+        return np.stack([self.low, self.step]), {}
+
+    @classmethod
+    def from_state(cls, state, meta, codes):
+        return cls(np.asarray(state[0]), np.asarray(state[1]), codes)
+
+
+class ProductQuantizer:
+    """Product quantization with asymmetric (float query, coded rows) scoring."""
+
+    name = "pq"
+
+    def __init__(self, bounds, centroids, codes=None):
+        self.bounds = bounds  # subspace j covers dims bounds[j]:bounds[j + 1]
+        self.centroids = centroids  # (N_CENTROIDS, d): subspace centroids side by side
+        self.codes = codes
+
+    @classmethod
+    def train(cls, vectors, n_subspaces=None, sample_size=64 * N_CENTROIDS, seed=0):
+        d = vectors.shape[1]
+        n_subspaces = min(n_subspaces or (d + 1) // 2, d)
+        bounds = [int(b) for b in np.linspace(0, d, n_subspaces + 1).round()]
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False))
+        sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+
+        centroids = np.zeros((N_CENTROIDS, d), dtype=np.float32)
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            sub = _kmeans(sample[:, lo:hi], N_CENTROIDS, seed=seed)
+            centroids[:len(sub), lo:hi] = sub
+            # Pad with copies so a code can never point at an unfitted centroid.
+            centroids[len(sub):, lo:hi] = sub[0]
+        codec = cls(bounds, centroids)
+        codec.codes = codec.encode(vectors)
+        return codec
+
+    def encode(self, vectors):
+        codes = np.empty((len(vectors), len(self.bounds) - 1), dtype=np.uint8)
+        for start in range(0, len(vectors), CHUNK_ROWS):
+            chunk = np.asarray(vectors[start:start + CHUNK_ROWS], dtype=np.float32)
+            for j, (lo, hi) in enumerate(zip(self.bounds[:-1], self.bounds[1:])):
+                sub_centroids = self.centroids[:, lo:hi]
+                dists = -2 * chunk[:, lo:hi] @ sub_centroids.T + (sub_centroids ** 2).sum(1)[None, :]
+                codes[start:start + len(chunk), j] = dists.argmin(axis=1)
+        return codes
+
+    def extended(self, vectors):
+        """Same codebooks with codes for all of `vectors` (no re-fitting)."""
+        return type(self)(self.bounds, self.centroids, self.encode(vectors))
+
+    def scores(self, queries, rows=None):
+        codes = self.codes if rows is None else self.codes[rows]
+        # (n_queries, n_subspaces, N_CENTROIDS) lookup table of partial dot products.
+        tables = np.stack([
+            queries[:, lo:hi] @ self.centroids[:, lo:hi].T
+            for lo, hi in zip(self.bounds[:-1], self.bounds[1:])
+        ], axis=1)
+        out = np.zeros((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), CHUNK_ROWS):
+            chunk = np.asarray(codes[start:start + CHUNK_ROWS])
+            for j in range(chunk.shape[1]):
+                out[:, start:start + len(chunk)] += tables[:, j, chunk[:, j]]
+        return out
+
+    def state(self):
+        return self.centroids, {"bounds": self.bounds}
+
+    @classmethod
+    def from_state(cls, state, meta, codes):
+        return cls(meta["bounds"], np.asarray(state), codes)
+
+
+CODECS = {
+    ScalarQuantizer.name: ScalarQuantizer,
+    ProductQuantizer.name: ProductQuantizer,
+}
+
+
+def save_codec(codec, artifact_dir):
+    state, meta = codec.state()
+    artifacts.write_array(os.path.join(artifact_dir, artifacts.CODES_FILE), codec.codes,
+                          codec=codec.name, **meta)
+    artifacts.write_array(os.path.join(artifact_dir, artifacts.CODEBOOK_FILE), state)
+
+
+def load_codec(artifact_dir):
+    """Return the codec saved in `artifact_dir`, or None if vectors are stored unquantized."""
+    codes_path = os.path.join(artifact_dir, artifacts.CODES_FILE)
+    if not os.path.exists(codes_path):
+        return None
+    codes, meta = artifacts.open_array(codes_path)
+    state, _ = artifacts.open_array(os.path.join(artifact_dir, artifacts.CODEBOOK_FILE))
+    return CODECS[meta["codec"]].from_state(state, meta, codes)
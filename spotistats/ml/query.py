@@ -0,0 +1,131 @@
+"""Headless batch similarity lookups: track IDs in, JSONL recommendations out.
+
+Reads one track ID per line from a file (or stdin; blank lines and lines
+starting with # are skipped) and writes one JSON object per input ID to
+stdout, in input order:
+
+    {"track_id": "...", "similar": [{"track_id", "track_name", "track_artist", "similarity"}, ...]}
+
+IDs not in the catalog get an empty "similar" list, as in the app. IDs are
+looked up in batches through SimilarityModel.find_similar_many. With
+--jobs N the batches are spread over N worker processes, each opening the
+memory-mapped artifacts itself, so the OS shares the pages between them.
+
+At most --in-flight batches are read ahead of the output, so memory stays
+bounded however long the input is. A summary goes to stderr.
+
+Run: python -m spotistats.ml.query [ids.txt] [--k 10] [--batch-size 1000] [--jobs 4] > recs.jsonl
+"""
+import argparse
+import collections
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .similarity_model import ARTIFACT_DIR, SimilarityModel
+
+BATCH_SIZE = 1000
+
+_model = None  # per worker process, see _init_worker
+
+
+def read_ids(lines):
+    for line in lines:
+        track_id = line.strip()
+        if track_id and not track_id.startswith("#"):
+            yield track_id
+
+
+def batched(items, size):
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _init_worker(artifact_dir):
+    global _model
+    _model = SimilarityModel(artifact_dir)
+
+
+def _query_batch(track_ids, k):
+    return _model.find_similar_many(track_ids, k=k)
+
+
+def _to_jsonl(track_ids, results):
+    return "".join(json.dumps({"track_id": track_id, "similar": similar}) + "\n"
+                   for track_id, similar in zip(track_ids, results))
+
+
+def run(track_ids, out, k=3, batch_size=BATCH_SIZE, jobs=1, in_flight=None,
+        artifact_dir=ARTIFACT_DIR):
+    """Write JSONL results for `track_ids` (any iterable) to `out`; returns (queried, not_found)."""
+    queried = not_found = 0
+
+    def emit(batch, results):
+        nonlocal queried, not_found
+        out.write(_to_jsonl(batch, results))
+        out.flush()
+        queried += len(batch)
+        not_found += sum(1 for similar in results if not similar)
+
+    batches = batched(track_ids, batch_size)
+    if jobs <= 1:
+        model = SimilarityModel(artifact_dir)
+        for batch in batches:
+            emit(batch, model.find_similar_many(batch, k=k))
+        return queried, not_found
+
+    # Executor.map would submit (and so read) the whole input up front; keep
+    # a window of at most `in_flight` batches instead, emitted in order.
+    in_flight = in_flight or 2 * jobs
+    pending = collections.deque()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(artifact_dir,)) as pool:
+        for batch in batches:
+            if len(pending) >= in_flight:
+                done_batch, future = pending.popleft()
+                emit(done_batch, future.result())
+            pending.append((batch, pool.submit(_query_batch, batch, k)))
+        while pending:
+            done_batch, future = pending.popleft()
+            emit(done_batch, future.result())
+    return queried, not_found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", nargs="?", default="-", help="file of track IDs, one per line (default: stdin)")
+    parser.add_argument("--k", type=int, default=3, help="similar tracks per ID")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--jobs", type=int, default=1, help="worker processes (1: query in this process)")
+    parser.add_argument("--in-flight", type=int, default=None,
+                        help="max batches queued ahead of the output (default: 2 x jobs)")
+    parser.add_argument("--artifact-dir", default=ARTIFACT_DIR)
+    args = parser.parse_args()
+    if args.k < 1 or args.batch_size < 1:
+        parser.error("--k and --batch-size must be positive")
+
+    start = time.perf_counter()
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    try:
+        with source:
+            queried, not_found = run(read_ids(source), sys.stdout, k=args.k, batch_size=args.batch_size,
+                                     jobs=args.jobs, in_flight=args.in_flight, artifact_dir=args.artifact_dir)
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into head); not an error worth a
+        # traceback. Point stdout at devnull so the exit-time flush can't fail too.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+    print(f"{queried} tracks ({not_found} not in catalog) in {elapsed:.1f}s "
+          f"({queried / elapsed if elapsed else 0:.0f}/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Append-only delta segments for adding tracks without retraining.
+
+train.py rebuilds every artifact from the full CSV. To add a handful of
+tracks, append_segment instead transforms just those tracks with the persisted
+scaler.joblib (so they land in the same feature space as the base catalog)
+and writes them as a small segment under artifacts/segments/<seq>/: a
+normalized feature artifact plus a track_meta.csv. Ingest cost is
+proportional to the number of new tracks, not the catalog.
+
+SimilarityModel searches the base index and all segments together. A track id
+that reappears in a later segment replaces the earlier row. Over time,
+compact() folds the segments into the base artifacts: new rows are added to
+the existing index and the precomputed neighbor table is patched with
+neighbors from the new rows, rather than retraining from scratch (a full
+rebuild only happens when segments replace base rows).
+
+compact() rewrites the base artifact files in place, so a running app keeps
+serving the version it loaded until it restarts. On Windows, files that are
+memory-mapped by a running app can't be replaced - compact while it's closed.
+
+Run: python -m spotistats.ml.segments add new_tracks.csv
+     python -m spotistats.ml.segments compact
+"""
+import argparse
+import os
+import shutil
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from . import artifacts, features, knn, quantization
+
+ARTIFACT_DIR = os.path.join(os.path.dirname(__file__), "artifacts")
+
+META_COLUMNS = ["track_id", "track_name", "track_artist"]
+
+
+def segment_paths(artifact_dir=ARTIFACT_DIR):
+    """Completed segment directories, oldest first."""
+    root = os.path.join(artifact_dir, artifacts.SEGMENTS_DIR)
+    if not os.path.isdir(root):
+        return []
+    names = sorted(name for name in os.listdir(root) if name.isdigit())
+    return [os.path.join(root, name) for name in names]
+
+
+def read_segments(paths):
+    """Return (vectors, meta) for the given segments concatenated in order."""
+    vectors, metas = [], []
+    for path in paths:
+        X, _ = artifacts.open_array(os.path.join(path, artifacts.FEATURES_FILE))
+        vectors.append(np.asarray(X))
+        metas.append(pd.read_csv(os.path.join(path, artifacts.TRACK_META_FILE)))
+    if not paths:
+        return None, pd.DataFrame(columns=META_COLUMNS)
+    return np.concatenate(vectors), pd.concat(metas, ignore_index=True)
+
+
+def append_segment(tracks, artifact_dir=ARTIFACT_DIR):
+    """Write `tracks` (one row per track, with META_COLUMNS and the raw audio
+    columns) as a new segment and return its path.
+
+    The segment is written under a temporary name and renamed into place, so
+    a reader never picks up a partial segment.
+    """
+    header, _ = artifacts.read_header(os.path.join(artifact_dir, artifacts.FEATURES_FILE))
+    scaler = joblib.load(os.path.join(artifact_dir, "scaler.joblib"))
+    tracks = tracks.drop_duplicates("track_id", keep="last").reset_index(drop=True)
+
+    raw = features.FeatureStore(tracks).raw(header["variant"])
+    X = knn.normalize_rows(scaler.transform(raw))
+
+    existing = segment_paths(artifact_dir)
+    seq = int(os.path.basename(existing[-1])) + 1 if existing else 1
+    path = os.path.join(artifact_dir, artifacts.SEGMENTS_DIR, f"{seq:06d}")
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    artifacts.write_array(os.path.join(tmp_path, artifacts.FEATURES_FILE), X,
+                          variant=header["variant"], normalized=True)
+    tracks[META_COLUMNS].to_csv(os.path.join(tmp_path, artifacts.TRACK_META_FILE), index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _patched_neighbor_table(index, n_old, old_ids, old_sims):
+    """Extend a neighbor table built over the first `n_old` rows of `index` to all of them.
+
+    Old rows keep their stored neighbors merged with their best matches among
+    the new rows; new rows get a full search. Cost is O(catalog x new rows).
+    """
+    k = old_ids.shape[1]
+    vectors = index.vectors
+    new_rows = np.arange(n_old, len(vectors))
+
+    ids = np.full((len(vectors), k), -1, dtype=np.int32)
+    sims = np.full((len(vectors), k), -np.inf, dtype=np.float16)
+
+    delta = knn.CosineIndex(vectors[n_old:])
+    step = knn.block_rows_for(len(new_rows))
+    for start in range(0, n_old, step):
+        stop = min(start + step, n_old)
+        d_ids, d_sims = delta.search(vectors[start:stop], k)
+        merged_ids, merged_sims = knn.merge_top_k(
+            np.asarray(old_ids[start:stop], dtype=np.int64), np.asarray(old_sims[start:stop]),
+            d_ids + n_old, d_sims, k,
+        )
+        ids[start:stop, :merged_ids.shape[1]] = merged_ids
+        sims[start:stop, :merged_sims.shape[1]] = merged_sims
+
+    new_ids, new_sims = index.search(vectors[n_old:], k, exclude=new_rows)
+    ids[n_old:, :new_ids.shape[1]] = new_ids
+    sims[n_old:, :new_sims.shape[1]] = new_sims
+    return ids, sims
+
+
+def compact(artifact_dir=ARTIFACT_DIR):
+    """Merge all current segments into the base artifacts; returns the number merged.
+
+    Segments appended while this runs are left for the next compaction.
+    """
+    paths = segment_paths(artifact_dir)
+    if not paths:
+        return 0
+
+    features_path = os.path.join(artifact_dir, artifacts.FEATURES_FILE)
+    base_X, header = artifacts.open_array(features_path)
+    base_meta = pd.read_csv(os.path.join(artifact_dir, artifacts.TRACK_META_FILE))
+    delta_X, delta_meta = read_segments(paths)
+
+    # Later segments win over earlier ones and over the base.
+    keep_delta = ~delta_meta["track_id"].duplicated(keep="last").to_numpy()
+    delta_X, delta_meta = delta_X[keep_delta], delta_meta[keep_delta]
+    keep_base = ~base_meta["track_id"].isin(delta_meta["track_id"]).to_numpy()
+    incremental = bool(keep_base.all())
+
+    base_vectors = np.asarray(base_X) if header.get("normalized") else knn.normalize_rows(base_X)
+    vectors = np.concatenate([base_vectors[keep_base], delta_X])
+    meta = pd.concat([base_meta[keep_base], delta_meta], ignore_index=True)
+
+    codec = None
+    if header.get("storage", "float32") != "float32":
+        codec = quantization.load_codec(artifact_dir)
+    index_cls = knn.INDEX_TYPES[header.get("index", knn.CosineIndex.name)]
+    index = index_cls.load(artifact_dir, base_X, codec=codec, rerank=header.get("rerank", 0))
+    index = index.extended(vectors) if incremental else index.rebuilt(vectors)
+
+    staging = os.path.join(artifact_dir, ".compact")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    header_meta = {key: value for key, value in header.items() if key not in ("dtype", "shape")}
+    header_meta["normalized"] = True
+    artifacts.write_array(os.path.join(staging, artifacts.FEATURES_FILE), vectors, **header_meta)
+    index.save(staging)
+    if index.codec is not None:
+        quantization.save_codec(index.codec, staging)
+
+    ids_path = os.path.join(artifact_dir, artifacts.NEIGHBOR_IDS_FILE)
+    if os.path.exists(ids_path):
+        old_ids, _ = artifacts.open_array(ids_path)
+        old_sims, _ = artifacts.open_array(os.path.join(artifact_dir, artifacts.NEIGHBOR_SIMS_FILE))
+        if incremental:
+            table_ids, table_sims = _patched_neighbor_table(index, len(base_X), old_ids, old_sims)
+        else:
+            table_ids, table_sims = knn.neighbor_table(index, old_ids.shape[1])
+        artifacts.write_array(os.path.join(staging, artifacts.NEIGHBOR_IDS_FILE), table_ids)
+        artifacts.write_array(os.path.join(staging, artifacts.NEIGHBOR_SIMS_FILE), table_sims)
+        del old_ids, old_sims
+    meta[META_COLUMNS].to_csv(os.path.join(staging, artifacts.TRACK_META_FILE), index=False)
+
+    # Release our own mappings before replacing the files they point at.
+    del base_X, base_vectors, codec
+    for name in os.listdir(staging):
+        os.replace(os.path.join(staging, name), os.path.join(artifact_dir, name))
+    os.rmdir(staging)
+    for path in paths:
+        shutil.rmtree(path)
+    return len(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add tracks to, or compact, the similarity index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("add", help="append tracks from a CSV with the TidyTuesday schema as a new segment")
+    add.add_argument("csv_path")
+    sub.add_parser("compact", help="merge all segments into the base artifacts")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        tracks = features.load_catalog(args.csv_path)
+        path = append_segment(tracks)
+        print(f"Wrote {len(tracks)} tracks to segment {path}")
+    else:
+        merged = compact()
+        print(f"Compacted {merged} segment(s) into {ARTIFACT_DIR}")
+
+
+if __name__ == "__main__":
+    main()
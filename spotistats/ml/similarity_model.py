@@ -5,44 +5,156 @@ no live feature extraction, since Spotify's audio-features endpoint is
 restricted for this app. A track not present in the catalog has no vector to
 query with, so callers should treat an empty result as "not enough data" and
 not as "no similar tracks exist".
+
+The L2-normalized feature matrix is memory-mapped from the float32 artifact
+rather than unpickled, so construction is cheap and processes share the pages
+through the OS cache. Artifacts from before that format
+(index.joblib/features.joblib) are not read - re-run train.py.
+
+Lookups answer from the precomputed neighbor table when it covers the
+requested k, and only fall back to a live search beyond that (or when the
+table hasn't been built). Live searches go through whichever knn index type
+train.py recorded in the artifact header - exact CosineIndex, where a batch of
+tracks costs one blocked matrix multiply, or the approximate IVFIndex.
+
+Tracks ingested since training (segments.py) are held in memory as a small
+delta and searched exactly alongside the base catalog; results from both are
+merged. A delta track with the same id as a base track replaces it; searches
+fetch one extra candidate per replaced row, and table rows that point at a
+replaced row are searched live, so the stale row never costs a result slot.
+
+If train.py stored quantized vectors (--storage int8|pq), live searches scan
+the codes and re-rank the best candidates against the memory-mapped floats,
+so the float matrix is only paged in for those rows.
 """
 import os
-import joblib
+import numpy as np
 import pandas as pd
 
+from . import artifacts, knn, quantization, segments
+from ..utils import metrics
+
 ARTIFACT_DIR = os.path.join(os.path.dirname(__file__), "artifacts")
 
 
 class SimilarityModel:
-    def __init__(self, artifact_dir=ARTIFACT_DIR):
-        self.index = joblib.load(os.path.join(artifact_dir, "index.joblib"))
-        self.X = joblib.load(os.path.join(artifact_dir, "features.joblib"))
-        meta = pd.read_csv(os.path.join(artifact_dir, "track_meta.csv"))
+    @metrics.timed("similarity.load")
+    def __init__(self, artifact_dir=ARTIFACT_DIR, rerank=None):
+        """`rerank` overrides the re-rank factor train.py recorded for quantized storage."""
+        self.X, header = artifacts.open_array(os.path.join(artifact_dir, artifacts.FEATURES_FILE))
+        self.variant = header["variant"]
+        if not header.get("normalized"):
+            self.X = knn.normalize_rows(self.X)
+        index_cls = knn.INDEX_TYPES[header.get("index", knn.CosineIndex.name)]
+        codec = None
+        if header.get("storage", "float32") != "float32":
+            codec = quantization.load_codec(artifact_dir)
+        if rerank is None:
+            rerank = header.get("rerank", 0)
+        self.index = index_cls.load(artifact_dir, self.X, codec=codec, rerank=rerank)
+        meta = pd.read_csv(os.path.join(artifact_dir, artifacts.TRACK_META_FILE))
+        self.neighbor_ids = None
+        self.neighbor_sims = None
+        ids_path = os.path.join(artifact_dir, artifacts.NEIGHBOR_IDS_FILE)
+        if os.path.exists(ids_path):
+            self.neighbor_ids, _ = artifacts.open_array(ids_path)
+            self.neighbor_sims, _ = artifacts.open_array(
+                os.path.join(artifact_dir, artifacts.NEIGHBOR_SIMS_FILE)
+            )
+
+        self.n_base = len(self.X)
+        self.delta, delta_meta = segments.read_segments(segments.segment_paths(artifact_dir))
+        self.delta_index = knn.CosineIndex(self.delta) if self.delta is not None else None
+        if len(delta_meta):
+            meta = pd.concat([meta, delta_meta], ignore_index=True)
+
         self.track_ids = meta["track_id"].tolist()
         self.track_names = meta["track_name"].tolist()
         self.track_artists = meta["track_artist"].tolist()
-        self._row_by_id = {track_id: i for i, track_id in enumerate(self.track_ids)}
+        self._row_by_id = {}
+        self._replaced = set()  # rows superseded by a later row with the same track id
+        for i, track_id in enumerate(self.track_ids):
+            if track_id in self._row_by_id:
+                self._replaced.add(self._row_by_id[track_id])
+            self._row_by_id[track_id] = i
+        self._replaced_mask = np.zeros(len(self.track_ids), dtype=bool)
+        self._replaced_mask[list(self._replaced)] = True
 
     def has_track(self, track_id):
         return track_id in self._row_by_id
 
     def find_similar(self, track_id, k=3):
-        row = self._row_by_id.get(track_id)
-        if row is None:
-            return []
-
-        distances, indices = self.index.kneighbors(self.X[row:row + 1], n_neighbors=k + 1)
-
-        results = []
-        for dist, idx in zip(distances[0], indices[0]):
-            if self.track_ids[idx] == track_id:
-                continue
-            results.append({
-                "track_id": self.track_ids[idx],
-                "track_name": self.track_names[idx],
-                "track_artist": self.track_artists[idx],
-                "similarity": 1 - dist,
-            })
-            if len(results) == k:
-                break
+        return self.find_similar_many([track_id], k=k)[0]
+
+    @metrics.timed("similarity.find_similar_many")
+    def find_similar_many(self, track_ids, k=3):
+        """Return one result list per entry of `track_ids`, in the same order.
+
+        Unknown tracks get an empty list, exactly as find_similar does.
+        """
+        results = [[] for _ in track_ids]
+        positions, rows = [], []
+        for pos, track_id in enumerate(track_ids):
+            row = self._row_by_id.get(track_id)
+            if row is not None:
+                positions.append(pos)
+                rows.append(row)
+        if not rows:
+            return results
+        rows = np.asarray(rows)
+        in_base = rows < self.n_base
+
+        # Replaced rows can take candidate slots before they're dropped, so
+        # searches fetch that many extra candidates and results are trimmed to k.
+        width = k + len(self._replaced)
+        ids = np.full((len(rows), width), -1, dtype=np.int64)
+        sims = np.full((len(rows), width), -np.inf, dtype=np.float32)
+        from_table = np.zeros(len(rows), dtype=bool)
+        if self.neighbor_ids is not None and k <= self.neighbor_ids.shape[1]:
+            from_table = in_base.copy()
+            if self._replaced:
+                # A table row pointing at a replaced track would come up short; search it live.
+                table_rows = np.flatnonzero(in_base)
+                stale = self._replaced_mask[self.neighbor_ids[rows[table_rows], :k]].any(axis=1)
+                from_table[table_rows[stale]] = False
+            ids[from_table, :k] = self.neighbor_ids[rows[from_table], :k]
+            sims[from_table, :k] = self.neighbor_sims[rows[from_table], :k]
+
+        live = ~from_table
+        if live.any() or self.delta_index is not None:
+            queries = self._vectors(rows)
+        if live.any():
+            live_ids, live_sims = self.index.search(
+                queries[live], width, exclude=np.where(in_base[live], rows[live], -1)
+            )
+            ids[live, :live_ids.shape[1]] = live_ids
+            sims[live, :live_sims.shape[1]] = live_sims
+        if self.delta_index is not None:
+            delta_ids, delta_sims = self.delta_index.search(
+                queries, width, exclude=np.where(in_base, -1, rows - self.n_base)
+            )
+            ids, sims = knn.merge_top_k(ids, sims, delta_ids + self.n_base, delta_sims, width)
+
+        for pos, row_ids, row_sims in zip(positions, ids.tolist(), sims.tolist()):
+            # Approximate indexes pad short result rows with id -1.
+            similar = [self._result(idx, sim) for idx, sim in zip(row_ids, row_sims)
+                       if idx >= 0 and not self._replaced_mask[idx]]
+            results[pos] = similar[:k]
         return results
+
+    def _vectors(self, rows):
+        """Normalized feature vectors for global row ids spanning base and delta."""
+        in_base = rows < self.n_base
+        out = np.empty((len(rows), self.X.shape[1]), dtype=np.float32)
+        out[in_base] = self.X[rows[in_base]]
+        if not in_base.all():
+            out[~in_base] = self.delta[rows[~in_base] - self.n_base]
+        return out
+
+    def _result(self, idx, similarity):
+        return {
+            "track_id": self.track_ids[idx],
+            "track_name": self.track_names[idx],
+            "track_artist": self.track_artists[idx],
+            "similarity": float(similarity),
+        }
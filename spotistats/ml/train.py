@@ -1,40 +1,105 @@
-"""Offline training: builds the song-similarity NearestNeighbors index over the
-full track catalog and persists it for the live app to load.
+"""Offline training: builds the song-similarity feature artifact and search
+index over the full track catalog and persists them for the live app to load.
 
-Run: python -m spotistats.ml.train
+The standardized feature matrix is L2-normalized and written as a float32
+memmap-able artifact (see artifacts.py) whose header carries the variant,
+column list, scaler statistics and index type, so the app can open it without
+unpickling anything and run cosine search as plain dot products.
+
+Since the catalog is static, the top-NEIGHBOR_TABLE_K neighbors of every track
+are also precomputed here (int32 ids + float16 similarities), turning most
+live lookups into a row slice instead of a full-catalog search.
+
+`--index exact` (the default) searches the whole catalog; `--index ivf` builds
+an approximate inverted-file index for catalogs too large for that. Use
+`python -m spotistats.ml.evaluate --mode ann` to pick --n-lists/--n-probe.
+
+`--storage int8|pq` additionally stores a quantized copy of the vectors that
+the index scans instead of the float matrix (see quantization.py), with the
+top `--rerank` x k candidates re-scored exactly; `--mode quant` in evaluate.py
+measures the cost.
+
+Run: python -m spotistats.ml.train [--index ivf --n-lists 1024 --n-probe 8]
+                                   [--storage pq --pq-subspaces 7 --rerank 4]
 """
+import argparse
 import os
 import joblib
-from sklearn.neighbors import NearestNeighbors
 
-from . import features
+from . import artifacts, catalog_cache, features, knn, quantization
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 ARTIFACT_DIR = os.path.join(os.path.dirname(__file__), "artifacts")
 CSV_PATH = os.path.join(DATA_DIR, "spotify_songs.csv")
 
-N_NEIGHBORS = 4  # 3 similar tracks + the query track itself, which is always its own nearest neighbor
+NEIGHBOR_TABLE_K = 32  # lookups asking for more than this fall back to a live search
+RERANK_FACTOR = 4  # quantized storage: candidates re-scored exactly, as a multiple of k
 
 
-def train(variant=features.DEFAULT_VARIANT):
-    catalog = features.load_catalog(CSV_PATH)
-    X, scaler = features.build_feature_matrix(catalog, variant=variant)
+def train(variant=features.DEFAULT_VARIANT, index_type="exact", storage="float32",
+          codec_params=None, rerank=RERANK_FACTOR, csv_path=CSV_PATH, artifact_dir=ARTIFACT_DIR,
+          cache_dir=catalog_cache.CACHE_DIR, **index_params):
+    catalog = catalog_cache.load_catalog(csv_path, cache_dir=cache_dir)
+    X, scaler = features.FeatureStore(catalog).feature_matrix(variant)
+    X = knn.normalize_rows(X)
 
-    index = NearestNeighbors(n_neighbors=N_NEIGHBORS, metric="cosine")
-    index.fit(X)
+    codec = None
+    if storage != "float32":
+        codec = quantization.CODECS[storage].train(X, **(codec_params or {}))
+    else:
+        rerank = 0
+    index = knn.INDEX_TYPES[index_type].build(X, codec=codec, rerank=rerank, **index_params)
 
-    os.makedirs(ARTIFACT_DIR, exist_ok=True)
-    joblib.dump(scaler, os.path.join(ARTIFACT_DIR, "scaler.joblib"))
-    joblib.dump(index, os.path.join(ARTIFACT_DIR, "index.joblib"))
-    joblib.dump(X, os.path.join(ARTIFACT_DIR, "features.joblib"))
-    joblib.dump(variant, os.path.join(ARTIFACT_DIR, "variant.joblib"))
+    os.makedirs(artifact_dir, exist_ok=True)
+    joblib.dump(scaler, os.path.join(artifact_dir, "scaler.joblib"))
+    artifacts.write_array(
+        os.path.join(artifact_dir, artifacts.FEATURES_FILE),
+        X,
+        variant=variant,
+        normalized=True,
+        index=index_type,
+        storage=storage,
+        rerank=rerank,
+        columns=features.FEATURE_VARIANTS[variant],
+        scaler_mean=scaler.mean_.tolist(),
+        scaler_scale=scaler.scale_.tolist(),
+    )
+    index.save(artifact_dir)
+    if codec is not None:
+        quantization.save_codec(codec, artifact_dir)
+    neighbor_ids, neighbor_sims = knn.neighbor_table(index, NEIGHBOR_TABLE_K)
+    artifacts.write_array(os.path.join(artifact_dir, artifacts.NEIGHBOR_IDS_FILE), neighbor_ids)
+    artifacts.write_array(os.path.join(artifact_dir, artifacts.NEIGHBOR_SIMS_FILE), neighbor_sims)
     catalog[["track_id", "track_name", "track_artist"]].to_csv(
-        os.path.join(ARTIFACT_DIR, "track_meta.csv"), index=False
+        os.path.join(artifact_dir, artifacts.TRACK_META_FILE), index=False
     )
 
-    print(f"Trained on {len(catalog)} unique tracks using variant '{variant}'")
-    print(f"Artifacts written to {ARTIFACT_DIR}")
+    print(f"Trained on {len(catalog)} unique tracks using variant '{variant}' and a '{index_type}' index "
+          f"over {storage} vectors")
+    print(f"Artifacts written to {artifact_dir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--variant", default=features.DEFAULT_VARIANT, choices=sorted(features.FEATURE_VARIANTS))
+    parser.add_argument("--index", default="exact", choices=sorted(knn.INDEX_TYPES))
+    parser.add_argument("--n-lists", type=int, default=None, help="ivf: number of k-means buckets (default 4*sqrt(n))")
+    parser.add_argument("--n-probe", type=int, default=knn.IVFIndex.DEFAULT_N_PROBE, help="ivf: buckets scanned per query")
+    parser.add_argument("--storage", default="float32", choices=["float32"] + sorted(quantization.CODECS))
+    parser.add_argument("--pq-subspaces", type=int, default=None, help="pq: number of subspaces (default ceil(d/2))")
+    parser.add_argument("--rerank", type=int, default=RERANK_FACTOR,
+                        help="int8/pq: re-score k * rerank candidates exactly (0 disables)")
+    args = parser.parse_args()
+
+    index_params = {}
+    if args.index == "ivf":
+        index_params = {"n_lists": args.n_lists, "n_probe": args.n_probe}
+    codec_params = {}
+    if args.storage == "pq":
+        codec_params = {"n_subspaces": args.pq_subspaces}
+    train(variant=args.variant, index_type=args.index, storage=args.storage,
+          codec_params=codec_params, rerank=args.rerank, **index_params)
 
 
 if __name__ == "__main__":
-    train()
+    main()
@@ -1,55 +1,306 @@
-"""AI service wrapper around existing `auth.getOpenAIClient()` with defensive parsing."""
+"""AI service wrapper around existing `auth.getOpenAIClient()` with defensive parsing.
+
+Suggestions are cached persistently (services/cache.py) per track, model and
+prompt version, so a track heard again costs no API call.
+
+The completion is streamed: stream_chord_suggestions yields each chord
+progression as soon as the comma after it arrives, so the UI can show
+the first one long before the last token. A `cancelled` callable is checked
+between chunks; once it returns True the stream is closed, which stops the
+completion instead of paying for tokens nobody will see.
+
+Requests go through a small scheduling layer:
+- single-flight: concurrent requests for the same track share one in-flight
+  completion; followers replay its progressions as they stream in (and
+  retry themselves only if the leader was cancelled part way);
+- a token bucket (config.AI_RATE_PER_MIN, bursts of config.AI_BURST) keeps
+  us inside the API quota; low-priority (prefetch) requests never wait for
+  a token, they're dropped unless one is free;
+- 429/5xx responses and connection errors are retried with jittered
+  exponential backoff that honours Retry-After, as long as nothing has been
+  yielded yet (the OpenAI client's own retries are turned off in favour of
+  these).
+stats() returns counters for all of it.
+"""
+import json
 import logging
+import threading
+import time
+from collections import Counter
 import auth
 
+from .. import config
+from .cache import PersistentCache
+from .rate_limit import TokenBucket, retry_after_seconds, retry_delay, sleep
+from ..utils import metrics
+
 logger = logging.getLogger(__name__)
 
-class AIService:
+MODEL = "gpt-4o-mini"
+PROMPT_VERSION = 2  # bump when the prompt or parsing changes, to invalidate cached answers
+N_PROGRESSIONS = 3
+
+class ChordStreamParser:
+    """Split streamed text into chord progressions at each comma."""
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, text):
+        """Add a chunk of text; return the progressions it completed."""
+        self._buffer += text
+        *complete, self._buffer = self._buffer.split(",")
+        return [p.strip() for p in complete if p.strip()]
+
+    def close(self):
+        """Return the trailing progression, if any, once the stream has ended."""
+        last, self._buffer = self._buffer.strip(), ""
+        return [last] if last else []
+
+class _Flight:
+    """One in-flight completion, shared by every concurrent request for its key."""
+
     def __init__(self):
-        self._client = None
+        self.chords = []
+        self.done = False
+        self.abandoned = False  # leader stopped early (cancelled), so followers must retry
+        self.cond = threading.Condition()
+
+    def add(self, chord):
+        with self.cond:
+            self.chords.append(chord)
+            self.cond.notify_all()
+
+    def finish(self, abandoned):
+        with self.cond:
+            self.done = True
+            self.abandoned = abandoned
+            self.cond.notify_all()
+
+def _is_retryable(error):
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    from openai import APIConnectionError  # already loaded by then: the client raised it
+    return isinstance(error, APIConnectionError)
+
+def _delta_text(chunk):
+    """Text carried by one streamed chunk (object or dict shaped), or ''."""
+    try:
+        choices = chunk.choices
+    except AttributeError:
+        choices = chunk.get('choices') if isinstance(chunk, dict) else None
+    if not choices:
+        return ""
+    try:
+        return choices[0].delta.content or ""
+    except Exception:
+        try:
+            return choices[0]['delta']['content'] or ""
+        except Exception:
+            return ""
+
+class AIService:
+    def __init__(self, cache=None, client=None, bucket=None):
+        self._client = client
+        self._client_lock = threading.Lock()  # warm_up() races the first fetch job
+        self._cache = cache if cache is not None else PersistentCache(
+            "ai_suggestions", max_entries=config.AI_CACHE_MAX_ENTRIES, ttl=config.AI_CACHE_TTL)
+        self._bucket = bucket if bucket is not None else TokenBucket(
+            config.AI_RATE_PER_MIN / 60, config.AI_BURST)
+        self._flights = {}  # cache key -> _Flight
+        self._flights_lock = threading.Lock()
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
 
     def _ensure_client(self):
         if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    try:
+                        client = auth.getOpenAIClient()
+                        # Retries are ours (see _stream_completion), not the SDK's.
+                        self._client = client.with_options(max_retries=0)
+                    except Exception:
+                        logger.exception("Failed to initialize OpenAI client")
+                        self._client = None
+
+    def warm_up(self):
+        """Create the client now (importing openai is slow) so the first request doesn't wait."""
+        self._ensure_client()
+
+    def _cache_key(self, track_name, artist, track_id):
+        track_key = track_id or f"{track_name}|{artist}"
+        return f"{track_key}|{MODEL}|v{PROMPT_VERSION}"
+
+    def get_chord_suggestions(self, track_name, artist, track_id=None, cancelled=None, low_priority=False):
+        chord_progressions = list(self.stream_chord_suggestions(
+            track_name, artist, track_id, cancelled=cancelled, low_priority=low_priority))
+        if not chord_progressions:
+            return []
+        while len(chord_progressions) < N_PROGRESSIONS:
+            chord_progressions.append("-")
+        return chord_progressions
+
+    def stats(self):
+        """Counters: cache_hits, requests, coalesced, throttled, deferred, rate_limited, retries, errors."""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+        metrics.incr(f"ai.{name}")
+
+    def stream_chord_suggestions(self, track_name, artist, track_id=None, cancelled=None,
+                                 low_priority=False):
+        """Yield up to N_PROGRESSIONS chord progressions as they complete.
+
+        Only a stream that ran to completion is cached; a cancelled or failed
+        one just stops yielding. A `low_priority` request (prefetch) is only
+        sent if a rate-limit token is free right now - it never waits for one,
+        so it can't hold up or starve a request for the playing track.
+        """
+        key = self._cache_key(track_name, artist, track_id)
+        cached = self._cache.get(key)
+        if cached is not None:
+            try:
+                chords = json.loads(cached)
+                self._count("cache_hits")
+                yield from chords
+                return
+            except ValueError:
+                logger.warning("Ignoring corrupt cached AI suggestions for %s", key)
+
+        yielded = 0
+        while True:
+            with self._flights_lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+
+            if not leader:
+                self._count("coalesced")
+                for chord in self._follow(flight, yielded, cancelled):
+                    yielded += 1
+                    yield chord
+                if not flight.abandoned or (cancelled and cancelled()):
+                    return
+                continue  # the leader gave up; take over
+
+            abandoned = True
+            outcome = {}
             try:
-                self._client = auth.getOpenAIClient()
-            except Exception:
-                logger.exception("Failed to initialize OpenAI client")
-                self._client = None
+                for chord in self._stream_completion(track_name, artist, cancelled, low_priority, outcome):
+                    flight.add(chord)
+                    if len(flight.chords) > yielded:
+                        yielded += 1
+                        yield chord
+                # Anything short of a finished stream (cancelled, failed part
+                # way, no free token) is abandoned: followers retry on their
+                # own, and the partial answer isn't cached.
+                abandoned = not outcome.get("completed")
+            finally:
+                with self._flights_lock:
+                    self._flights.pop(key, None)
+                flight.finish(abandoned)
+            if flight.chords and not abandoned:
+                self._cache.put(key, json.dumps(flight.chords).encode("utf-8"))
+            return
 
-    def get_chord_suggestions(self, track_name, artist):
+    def _follow(self, flight, start, cancelled):
+        """Yield `flight`'s progressions from index `start` on, as the leader produces them."""
+        i = start
+        while True:
+            with flight.cond:
+                while len(flight.chords) <= i and not flight.done:
+                    flight.cond.wait(0.1)
+                    if cancelled and cancelled():
+                        return
+                new = flight.chords[i:]
+                done = flight.done
+            for chord in new:
+                yield chord
+            i += len(new)
+            if done and i >= len(flight.chords):
+                return
+
+    def _stream_completion(self, track_name, artist, cancelled, low_priority=False, outcome=None):
+        """Yield progressions from one completion (with retries); sets
+        outcome["completed"] only if the stream ran to its end."""
+        outcome = {} if outcome is None else outcome
         self._ensure_client()
         if not self._client:
-            return []
+            return
 
-        try:
-            response = self._client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "developer", "content": "You are a music expert who provides accurate sound design suggestions to imitate to vibe of songs."},
-                          {"role": "user", "content": f"Given the song '{track_name}' by {artist}, generate three chord progressions, using the following format, that would imitate the vibe of the song (your output will be parsed at each underscore). Do not provide any additional information/words: Cmaj-Fmaj-Gmaj7-Amaj, Dsus-Gmin-Amaj11-Bmin, Fmaj-Gmaj7-Asus-Bbmaj"}],
-                max_tokens=50,
-                timeout=15,
-            )
-
-            choices = getattr(response, 'choices', None)
-            if not choices:
-                return []
-
-            content = None
+        for attempt in range(config.AI_MAX_RETRIES + 1):
+            if low_priority:
+                if self._bucket.try_acquire() != 0:
+                    self._count("deferred")
+                    return
+            else:
+                acquired, waited = self._bucket.acquire(cancelled)
+                if waited:
+                    self._count("throttled")
+                if not acquired:
+                    return
+            self._count("requests")
+
+            stream = None
+            emitted = 0
+            started = time.perf_counter()
             try:
-                content = choices[0].message.content
-            except Exception:
-                try:
-                    content = choices[0]['message']['content']
-                except Exception:
-                    content = None
-
-            if not content:
-                return []
-
-            chord_progressions = content.split(", ")
-            while len(chord_progressions) < 3:
-                chord_progressions.append("-")
-            return chord_progressions[:3]
-        except Exception:
-            logger.exception("AI request failed")
-            return []
+                stream = self._client.chat.completions.create(
+                    model=MODEL,
+                    messages=[{"role": "developer", "content": "You are a music expert who provides accurate sound design suggestions to imitate to vibe of songs."},
+                              {"role": "user", "content": f"Given the song '{track_name}' by {artist}, generate three chord progressions, using the following format, that would imitate the vibe of the song (your output will be parsed at each underscore). Do not provide any additional information/words: Cmaj-Fmaj-Gmaj7-Amaj, Dsus-Gmin-Amaj11-Bmin, Fmaj-Gmaj7-Asus-Bbmaj"}],
+                    max_tokens=50,
+                    timeout=15,
+                    stream=True,
+                )
+
+                parser = ChordStreamParser()
+                for chunk in stream:
+                    if cancelled and cancelled():
+                        logger.debug("AI stream for '%s' cancelled", track_name)
+                        return
+                    for chord in parser.feed(_delta_text(chunk)):
+                        if not emitted:
+                            metrics.observe("ai.first_progression", time.perf_counter() - started)
+                        yield chord
+                        emitted += 1
+                        if emitted == N_PROGRESSIONS:
+                            outcome["completed"] = True
+                            return  # anything after the last progression is noise
+                for chord in parser.close()[:N_PROGRESSIONS - emitted]:
+                    yield chord
+                outcome["completed"] = True
+                metrics.observe("ai.completion", time.perf_counter() - started)
+                return
+            except Exception as e:
+                if getattr(e, 'status_code', None) == 429:
+                    self._count("rate_limited")
+                if emitted or not _is_retryable(e) or attempt == config.AI_MAX_RETRIES:
+                    self._count("errors")
+                    logger.exception("AI request failed")
+                    return
+                retry_after = retry_after_seconds(getattr(getattr(e, 'response', None), 'headers', None))
+                delay = retry_delay(attempt, config.AI_BACKOFF, retry_after)
+                if delay is None:
+                    self._count("errors")
+                    logger.warning("AI request failed (%s) and Retry-After is %.0fs; giving up",
+                                   getattr(e, 'status_code', None) or type(e).__name__, retry_after)
+                    return
+                logger.warning("AI request failed (%s), retry %d in %.1fs",
+                               getattr(e, 'status_code', None) or type(e).__name__, attempt + 1, delay)
+                self._count("retries")
+            finally:
+                close = getattr(stream, 'close', None)
+                if close is not None:
+                    try:
+                        close()
+                    except Exception:
+                        logger.debug("Failed to close AI stream", exc_info=True)
+            if not sleep(delay, cancelled):
+                return
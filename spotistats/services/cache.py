@@ -0,0 +1,123 @@
+"""Small persistent key/value cache on SQLite, with LRU eviction and a TTL.
+
+Used to keep results of slow network calls (AI suggestions, album art) across
+runs. Each cache is one table in config.CACHE_DB. Entries expire `ttl`
+seconds after being written; beyond `max_entries` entries or `max_bytes` of
+values, the least recently read ones are evicted first.
+
+Safe to share across threads (one connection behind a lock). Any SQLite
+failure is logged and treated as a miss, so a broken cache file never breaks
+the feature it sits in front of.
+"""
+import logging
+import sqlite3
+import threading
+import time
+
+from .. import config
+
+logger = logging.getLogger(__name__)
+
+
+class PersistentCache:
+    def __init__(self, table, path=None, max_entries=None, max_bytes=None, ttl=None):
+        self.table = table
+        self.path = path or config.CACHE_DB
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+        self._count = 0
+        self._bytes = 0
+
+    def _ensure_conn(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_lru ON {self.table} (last_used)")
+            conn.commit()
+            self._count, self._bytes = conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}"
+            ).fetchone()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key):
+        """Return the cached bytes for `key`, or None on a miss or expired entry."""
+        with self._lock:
+            try:
+                conn = self._ensure_conn()
+                row = conn.execute(
+                    f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                value, created = row
+                now = time.time()
+                if self.ttl is not None and now - created > self.ttl:
+                    self._delete(conn, key, len(value))
+                    conn.commit()
+                    return None
+                conn.execute(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", (now, key))
+                conn.commit()
+                return bytes(value)
+            except sqlite3.Error:
+                logger.exception("Cache read failed (%s)", self.table)
+                return None
+
+    def put(self, key, value):
+        """Store `value` (bytes) under `key`, evicting old entries if over budget."""
+        with self._lock:
+            try:
+                conn = self._ensure_conn()
+                old = conn.execute(f"SELECT size FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                if old is not None:
+                    self._delete(conn, key, old[0])
+                now = time.time()
+                conn.execute(
+                    f"INSERT INTO {self.table} (key, value, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, sqlite3.Binary(value), len(value), now, now),
+                )
+                self._count += 1
+                self._bytes += len(value)
+                self._evict(conn, now)
+                conn.commit()
+            except sqlite3.Error:
+                logger.exception("Cache write failed (%s)", self.table)
+
+    def _delete(self, conn, key, size):
+        conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        self._count -= 1
+        self._bytes -= size
+
+    def _evict(self, conn, now):
+        if self.ttl is not None:
+            expired = conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table} WHERE created < ?",
+                (now - self.ttl,),
+            ).fetchone()
+            if expired[0]:
+                conn.execute(f"DELETE FROM {self.table} WHERE created < ?", (now - self.ttl,))
+                self._count -= expired[0]
+                self._bytes -= expired[1]
+
+        # Walk from least recently used until back under both budgets.
+        while self._over_budget():
+            batch = conn.execute(
+                f"SELECT key, size FROM {self.table} ORDER BY last_used ASC LIMIT 64"
+            ).fetchall()
+            if not batch:
+                break
+            for key, size in batch:
+                if not self._over_budget():
+                    break
+                self._delete(conn, key, size)
+
+    def _over_budget(self):
+        return ((self.max_entries is not None and self._count > self.max_entries)
+                or (self.max_bytes is not None and self._bytes > self.max_bytes))
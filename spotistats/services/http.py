@@ -0,0 +1,50 @@
+"""Shared pooled HTTP session.
+
+Every network call in the app (album art, the Spotify Web API via spotipy)
+goes through one requests.Session, so connections to each host are kept
+alive and reused instead of paying a TCP+TLS handshake per request.
+Idempotent requests are retried with exponential backoff on connection
+errors and 429/5xx responses, honouring Retry-After.
+
+requests.Session is safe to share between the worker threads for the plain
+GET/POST calls made here; its urllib3 pools are thread-safe.
+"""
+import threading
+
+from .. import config
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+
+def _build_session():
+    # Imported here rather than at module level to keep app startup fast.
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=config.HTTP_RETRIES,
+        backoff_factor=config.HTTP_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD", "PUT", "DELETE"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=config.HTTP_POOL_HOSTS,
+                          pool_maxsize=config.HTTP_POOL_SIZE,
+                          max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def get_session():
+    """Return the process-wide session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
@@ -0,0 +1,74 @@
+"""Album art fetching with a two-tier cache keyed by image URL.
+
+Full-resolution image bytes are kept in a bounded in-memory LRU, backed by a
+size-capped on-disk cache (services/cache.py), so a repeat track or the
+fullscreen view costs no download. Spotify image URLs are content-addressed,
+so entries never go stale and need no TTL.
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+from .. import config
+from .cache import PersistentCache
+from .http import get_session
+
+logger = logging.getLogger(__name__)
+
+def album_cover_url(track):
+    """URL of the largest cover image of a Spotify track object, or None."""
+    try:
+        return track['album']['images'][0]['url']
+    except (KeyError, IndexError, TypeError):
+        return None
+
+class ImageService:
+    def __init__(self, disk_cache=None, max_memory_bytes=None):
+        self._disk = disk_cache if disk_cache is not None else PersistentCache(
+            "album_art", max_bytes=config.IMAGE_CACHE_DISK_BYTES)
+        self._max_memory_bytes = max_memory_bytes or config.IMAGE_CACHE_MEMORY_BYTES
+        self._memory = OrderedDict()  # url -> bytes, least recently used first
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def cached(self, url):
+        """Return the image bytes for `url` if cached in memory or on disk, else None."""
+        with self._lock:
+            data = self._memory.get(url)
+            if data is not None:
+                self._memory.move_to_end(url)
+                return data
+        data = self._disk.get(url)
+        if data is not None:
+            self._remember(url, data)
+        return data
+
+    def get_image(self, url):
+        """Return the image bytes for `url`, downloading them on a cache miss.
+
+        Returns None if the download fails.
+        """
+        data = self.cached(url)
+        if data is not None:
+            return data
+        try:
+            resp = get_session().get(url, timeout=8)
+            resp.raise_for_status()
+            data = resp.content
+        except Exception:
+            logger.exception("Failed to fetch image %s", url)
+            return None
+        self._remember(url, data)
+        self._disk.put(url, data)
+        return data
+
+    def _remember(self, url, data):
+        with self._lock:
+            old = self._memory.pop(url, None)
+            if old is not None:
+                self._memory_bytes -= len(old)
+            self._memory[url] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self._max_memory_bytes and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
@@ -0,0 +1,56 @@
+"""Snapshot of Spotify playback that extrapolates progress locally.
+
+Between polls, a playing track's progress advances in real time, so it can be
+predicted from the last observed progress_ms and the local (monotonic) time
+it was received at, instead of asking Spotify again. The payload's own
+`timestamp` field is the server time of the last state change rather than of
+the response, so it isn't a usable anchor on its own.
+
+The poller compares each fresh observation with the prediction: a mismatch
+beyond a threshold (a seek, a pause, a stalled stream) is drift.
+"""
+import time
+
+
+class PlaybackState:
+    def __init__(self, item, is_playing, progress_ms, observed_at=None):
+        self.item = item
+        self.track_id = item.get('id')
+        self.duration_ms = item.get('duration_ms')
+        self.is_playing = is_playing
+        self.progress_ms = progress_ms
+        self.observed_at = time.monotonic() if observed_at is None else observed_at
+
+    @classmethod
+    def from_payload(cls, payload, observed_at=None):
+        """Build a state from a currently-playing/player payload; None if nothing is playing."""
+        item = payload.get('item') if payload else None
+        if not item:
+            return None
+        return cls(item, bool(payload.get('is_playing', False)), payload.get('progress_ms'), observed_at)
+
+    def progress_at(self, now=None):
+        """Predicted progress (ms) at monotonic time `now`, clamped to the track length."""
+        if self.progress_ms is None:
+            return None
+        progress = self.progress_ms
+        if self.is_playing:
+            now = time.monotonic() if now is None else now
+            progress += (now - self.observed_at) * 1000
+        if self.duration_ms is not None:
+            progress = min(progress, self.duration_ms)
+        return progress
+
+    def remaining_ms(self, now=None):
+        """Predicted time (ms) until the track ends, or None if unknown."""
+        progress = self.progress_at(now)
+        if progress is None or self.duration_ms is None:
+            return None
+        return self.duration_ms - progress
+
+    def drift_ms(self, observed):
+        """How far `observed` (a later state of the same track) is from this state's prediction."""
+        predicted = self.progress_at(observed.observed_at)
+        if predicted is None or observed.progress_ms is None:
+            return 0
+        return abs(observed.progress_ms - predicted)
@@ -0,0 +1,113 @@
+"""Warm the caches for the next tracks in the user's queue.
+
+On each track change the window asks the PrefetchService to look ahead: it
+reads the upcoming queue and, for the next config.PREFETCH_DEPTH tracks, fetches
+the cover art (ImageService), the chord suggestions (AIService, cached
+persistently) and the similar tracks (SimilarityService). When playback
+reaches one of them, the fetch job finds everything cached and the panels
+fill in without a visible delay.
+
+Prefetching is background, best-effort work: it runs on its own single
+thread (so it never holds up the foreground fetch pool), at most one pass is
+in flight at a time, each track is warmed once, and any failure is logged and
+ignored. A pass is cancelled by the next track change (which schedules a new
+one) and by shutdown(). Its AI requests are low priority: they only go out
+when a rate-limit token is free, so they never queue for quota in front of
+the playing track. The services are injected, so it can be driven by a stub whose
+queue() returns canned payloads.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .. import config
+from .image_service import album_cover_url
+
+logger = logging.getLogger(__name__)
+
+WARMED_MEMORY = 512  # track ids remembered as already warmed
+
+class PrefetchService:
+    def __init__(self, spotify_service, ai_service=None, image_service=None,
+                 similarity_service=None, depth=None):
+        self.spotify_service = spotify_service
+        self.ai_service = ai_service
+        self.image_service = image_service
+        self.similarity_service = similarity_service
+        self.depth = config.PREFETCH_DEPTH if depth is None else depth
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._cancel = None  # Event of the latest pass; set to cancel it
+        self._closed = False
+        self._warmed = OrderedDict()  # track id -> None, oldest first
+
+    def schedule(self):
+        """Cancel any earlier pass and start a new one in the background.
+
+        Returns the pass's Future, or None if prefetching is off or shut down.
+        """
+        if self.depth <= 0:
+            return None
+        with self._lock:
+            if self._closed:
+                return None
+            if self._cancel is not None:
+                self._cancel.set()  # its queue snapshot is stale now
+            cancel = self._cancel = threading.Event()
+        try:
+            return self._executor.submit(self._run, cancel)
+        except RuntimeError:  # executor shut down
+            return None
+
+    def shutdown(self):
+        """Cancel the running pass so the prefetch thread exits promptly (it's joined at exit)."""
+        with self._lock:
+            self._closed = True
+            if self._cancel is not None:
+                self._cancel.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def upcoming(self):
+        """The next `depth` queued tracks that haven't been warmed yet."""
+        queue = self.spotify_service.queue() or []
+        tracks = []
+        for track in queue[:self.depth]:
+            if not track or track.get('type', 'track') != 'track' or not track.get('id'):
+                continue  # podcast episodes, local files
+            if track['id'] not in self._warmed:
+                tracks.append(track)
+        return tracks
+
+    def _run(self, cancel):
+        try:
+            if cancel.is_set():
+                return
+            tracks = self.upcoming()
+            if not tracks:
+                return
+            logger.debug("Prefetching %d upcoming track(s)", len(tracks))
+            if self.similarity_service:
+                self.similarity_service.warm([track['id'] for track in tracks], k=3)
+            for track in tracks:
+                if cancel.is_set():
+                    return
+                self._warm(track, cancel)
+                if cancel.is_set():
+                    return  # possibly only half warmed; a later pass can retry it
+                self._warmed[track['id']] = None
+                while len(self._warmed) > WARMED_MEMORY:
+                    self._warmed.popitem(last=False)
+        except Exception:
+            logger.exception("Prefetch failed")
+
+    def _warm(self, track, cancel):
+        if self.image_service:
+            url = album_cover_url(track)
+            if url:
+                self.image_service.get_image(url)
+        if self.ai_service:
+            track_name = track.get('name', 'Unknown')
+            artist = ", ".join(a.get('name') for a in track.get('artists', []))
+            self.ai_service.get_chord_suggestions(track_name, artist, track['id'],
+                                                  cancelled=cancel.is_set, low_priority=True)
@@ -0,0 +1,87 @@
+"""Client-side rate limiting and retry backoff for metered APIs.
+
+TokenBucket keeps our request rate inside a quota: each call takes a token,
+tokens refill at a steady rate up to a burst capacity, and a caller that
+finds the bucket empty waits (in short slices, so it can be cancelled).
+
+retry_delay gives the wait before a retry: exponential backoff with full
+jitter, so clients that failed together don't retry together, but never
+shorter than a Retry-After the server sent. A Retry-After beyond
+MAX_BACKOFF_S means giving up (None) rather than retrying early into
+another 429.
+"""
+import random
+import threading
+import time
+
+MAX_BACKOFF_S = 30.0
+WAIT_SLICE_S = 0.1  # how often a waiting caller re-checks cancellation
+
+class TokenBucket:
+    def __init__(self, rate_per_s, capacity):
+        self.rate_per_s = rate_per_s
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_s)
+        self._updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available; otherwise return the seconds until one will be."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate_per_s
+
+    def acquire(self, cancelled=None):
+        """Block until a token is taken. Returns (acquired, waited): acquired is
+        False if `cancelled` turned true while waiting."""
+        waited = False
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return True, waited
+            waited = True
+            if not sleep(min(wait, WAIT_SLICE_S), cancelled):
+                return False, waited
+
+def sleep(seconds, cancelled=None):
+    """Sleep for `seconds` in short slices; return False early if `cancelled` turns true."""
+    deadline = time.monotonic() + seconds
+    while True:
+        if cancelled and cancelled():
+            return False
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return True
+        time.sleep(min(remaining, WAIT_SLICE_S))
+
+def retry_after_seconds(headers):
+    """Parse a numeric Retry-After (or retry-after-ms) header; None if absent or unparseable."""
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return float(value) / 1000
+        value = headers.get("retry-after")
+        if value is not None:
+            return float(value)
+    except (TypeError, ValueError):
+        pass  # HTTP-date form; fall back to our own backoff
+    return None
+
+def retry_delay(attempt, base_s, retry_after=None):
+    """Seconds to wait before retry number `attempt` (0-based), or None if
+    the server asked for a longer wait than MAX_BACKOFF_S."""
+    if retry_after is not None and retry_after > MAX_BACKOFF_S:
+        return None
+    delay = random.uniform(0, min(MAX_BACKOFF_S, base_s * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
@@ -1,34 +1,86 @@
 """Similarity service wrapper around the offline-trained song-similarity model.
 
-The model is loaded once, lazily, on first use. If artifacts are missing
-(train.py hasn't been run) or loading fails for any reason, lookups just
-return an empty list instead of raising.
+The model is loaded once, lazily, on first use or by warm_up(), which the
+window calls in the background right after it first paints. If artifacts
+are missing (train.py hasn't been run) or loading fails for any reason,
+lookups just return an empty list instead of raising.
 """
 import logging
+import threading
+from collections import OrderedDict
 
 logger = logging.getLogger(__name__)
 
+RECENT_RESULTS = 256  # (track, k) results kept in memory
+
 class SimilarityService:
     def __init__(self):
         self._model = None
         self._load_failed = False
+        self._load_lock = threading.Lock()  # fetch jobs for several tracks may race to load
+        # Recent results by (track_id, k), filled by lookups and by warm().
+        self._recent = OrderedDict()
+        self._recent_lock = threading.Lock()
 
     def _ensure_model(self):
         if self._model is None and not self._load_failed:
-            try:
-                from ..ml.similarity_model import SimilarityModel
-                self._model = SimilarityModel()
-            except Exception:
-                logger.exception("Failed to load similarity model")
-                self._load_failed = True
+            with self._load_lock:
+                if self._model is None and not self._load_failed:
+                    try:
+                        from ..ml.similarity_model import SimilarityModel
+                        self._model = SimilarityModel()
+                    except Exception:
+                        logger.exception("Failed to load similarity model")
+                        self._load_failed = True
         return self._model
 
+    def warm_up(self):
+        """Load the model now, so the first track's lookup doesn't pay for it."""
+        self._ensure_model()
+
     def find_similar(self, track_id, k=3):
+        with self._recent_lock:
+            cached = self._recent.get((track_id, k))
+            if cached is not None:
+                self._recent.move_to_end((track_id, k))
+                return list(cached)
         model = self._ensure_model()
         if model is None:
             return []
         try:
-            return model.find_similar(track_id, k=k)
+            similar = model.find_similar(track_id, k=k)
         except Exception:
             logger.exception("Similarity lookup failed for %s", track_id)
             return []
+        self._remember(track_id, k, similar)
+        return similar
+
+    def warm(self, track_ids, k=3):
+        """Precompute results for `track_ids` so later find_similar calls are instant."""
+        model = self._ensure_model()
+        if model is None or not track_ids:
+            return
+        try:
+            results = model.find_similar_many(track_ids, k=k)
+        except Exception:
+            logger.exception("Similarity warm-up failed for %d tracks", len(track_ids))
+            return
+        for track_id, similar in zip(track_ids, results):
+            self._remember(track_id, k, similar)
+
+    def _remember(self, track_id, k, similar):
+        with self._recent_lock:
+            self._recent[(track_id, k)] = list(similar)
+            self._recent.move_to_end((track_id, k))
+            while len(self._recent) > RECENT_RESULTS:
+                self._recent.popitem(last=False)
+
+    def find_similar_many(self, track_ids, k=3):
+        model = self._ensure_model()
+        if model is None:
+            return [[] for _ in track_ids]
+        try:
+            return model.find_similar_many(track_ids, k=k)
+        except Exception:
+            logger.exception("Batch similarity lookup failed for %d tracks", len(track_ids))
+            return [[] for _ in track_ids]
@@ -1,20 +1,26 @@
 """Spotify service wrapper - lazy init and safe calls."""
 import logging
+import threading
 import auth
 
+from .http import get_session
+
 logger = logging.getLogger(__name__)
 
 class SpotifyService:
     def __init__(self):
         self._client = None
+        self._client_lock = threading.Lock()  # used from the poller and prefetch threads
 
     def _ensure_client(self):
         if self._client is None:
-            try:
-                self._client = auth.getSpotifyClient()
-            except Exception:
-                logger.exception("Failed to initialize Spotify client")
-                self._client = None
+            with self._client_lock:
+                if self._client is None:
+                    try:
+                        self._client = auth.getSpotifyClient(requests_session=get_session())
+                    except Exception:
+                        logger.exception("Failed to initialize Spotify client")
+                        self._client = None
 
     def current_playback(self):
         self._ensure_client()
@@ -26,8 +32,35 @@ class SpotifyService:
             logger.exception("Error fetching current playback")
             return None
 
+    def currently_playing(self):
+        """Lighter playback query: just the playing item, progress and play state.
+
+        market=from_token makes Spotify resolve the track for the user's
+        market, which drops the long available_markets lists from the payload.
+        """
+        self._ensure_client()
+        if not self._client:
+            return None
+        try:
+            return self._client.current_user_playing_track(market="from_token")
+        except Exception:
+            logger.exception("Error fetching currently playing track")
+            return None
+
     def playback_item(self):
         state = self.current_playback()
         if not state:
             return None
         return state.get('item')
+
+    def queue(self):
+        """Return the user's upcoming tracks (list of track objects), or None on failure."""
+        self._ensure_client()
+        if not self._client:
+            return None
+        try:
+            payload = self._client.queue()
+        except Exception:
+            logger.exception("Error fetching queue")
+            return None
+        return (payload or {}).get('queue') or []
@@ -1,30 +1,34 @@
-"""Main GUI for Spotistats using services and worker threads for network tasks."""
+"""Main GUI for Spotistats using services and worker threads for network tasks.
+
+Nothing slow happens before the window first paints: services create their
+clients and load the similarity model lazily. Right after the first paint
+the playback poller starts and the model and OpenAI client are warmed up in
+the background, so the first track doesn't wait for them. Startup
+milestones are recorded by utils/startup.py.
+"""
 import logging
-from PyQt5.QtCore import Qt, QTimer
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import Qt, QEvent, QTimer
 from PyQt5.QtGui import QIcon, QPixmap, QFont, QPainter, QBrush, QColor, QFontDatabase
 from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout, QFrame, QHBoxLayout, QApplication
 
+from .. import config
+from ..utils import metrics, startup
 from ..utils.logging_config import configure_logging
 from ..services.spotify_service import SpotifyService
 from ..services.ai_service import AIService
 from ..services.similarity_service import SimilarityService
+from ..services.image_service import ImageService, album_cover_url
+from ..services.prefetch_service import PrefetchService
 from ..workers.network_worker import FetchDataWorker
+from ..workers.playback_poller import PlaybackPoller
 from .marquee_label import MarqueeLabel
 from MiscUtil import FullscreenImageWindow
 
 configure_logging()
 logger = logging.getLogger(__name__)
 
-# Poll cadence (ms). While playing we use a relaxed baseline (catches manual
-# pause/skip/seek) but shrink the wait to land right on the track's end, so
-# changes still feel instant without polling every second for no reason.
-POLL_MS_ACTIVE = 5000
-POLL_MS_IDLE = 4000
-POLL_MS_MIN = 500
-# Consecutive empty polls tolerated before treating playback as stopped, so a
-# single transient API hiccup doesn't flash the UI to "No song playing."
-IDLE_GRACE_POLLS = 3
-
 class ClickableLabel(QLabel):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -144,21 +148,45 @@ class SpotifyApp(QWidget):
         self.spotify_service = SpotifyService()
         self.ai_service = AIService()
         self.similarity_service = SimilarityService()
+        self.image_service = ImageService()
+        self.prefetch_service = PrefetchService(self.spotify_service, self.ai_service,
+                                                self.image_service, self.similarity_service)
 
         # State
-        self.last_song_id = None
-        self.song_playing = False
         self.current_worker = None
-        self._workers = []  # keeps superseded workers alive until they finish
-        self._idle_streak = 0
-
-        # Timer - interval adapts based on playback state (see check_playback)
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.check_playback)
-        self.timer.start(POLL_MS_ACTIVE)
-
-        # Initial check
-        self.check_playback()
+        # Fixed-size pool shared by all fetch jobs, however fast tracks change.
+        self._executor = ThreadPoolExecutor(max_workers=config.WORKER_THREADS,
+                                            thread_name_prefix="fetch")
+        # Similar-tracks lookups are local and fast; keep them out of the network pool.
+        self._local_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="similar")
+        self._cover_url = None
+        # Rendered (scaled + rounded) covers by image URL, least recently used first.
+        self._pixmap_cache = OrderedDict()
+
+        # Playback is polled off the GUI thread; the poller only signals changes.
+        # It's started after the first paint (see _after_first_paint).
+        self.poller = PlaybackPoller(self.spotify_service)
+        self.poller.playback_changed.connect(self.on_playback_changed)
+        self.poller.playback_stopped.connect(self._show_idle)
+        self._painted = False
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._painted:
+            self._painted = True
+            startup.mark("window")
+            QTimer.singleShot(0, self._after_first_paint)
+
+    def _after_first_paint(self):
+        # The poller's first poll creates the Spotify client.
+        self.poller.start()
+        self._local_executor.submit(self._warm_up, "similarity", self.similarity_service)
+        self._executor.submit(self._warm_up, "ai", self.ai_service)
+
+    @staticmethod
+    def _warm_up(name, service):
+        with metrics.span("startup.warm_up." + name):
+            service.warm_up()
 
     def _album_clicked(self, event):
         if event.button() == Qt.LeftButton:
@@ -167,57 +195,26 @@ class SpotifyApp(QWidget):
             except Exception:
                 logger.exception("Error showing fullscreen cover")
 
-    def check_playback(self):
+    @metrics.timed("ui.playback_changed")
+    def on_playback_changed(self, item, is_playing, track_changed):
         try:
-            state = self.spotify_service.current_playback()
-            item = state.get('item') if state else None
-
-            if not item:
-                self._idle_streak += 1
-                if self._idle_streak >= IDLE_GRACE_POLLS and self.last_song_id is not None:
-                    self.last_song_id = None
-                    self.song_playing = False
-                    self.timer.setInterval(POLL_MS_IDLE)
-                    self._show_idle()
-                return
-
-            self._idle_streak = 0
-            track_id = item.get('id')
-            is_playing = state.get('is_playing', False)
-            track_changed = track_id != self.last_song_id
-            play_changed = is_playing != self.song_playing
-
-            # Recomputed every poll (not just on change) so the wait keeps
-            # shrinking as a track nears its end instead of staying fixed.
-            self.timer.setInterval(self._next_interval(state, item, is_playing))
-
-            if not track_changed and not play_changed:
-                return
-
-            self.last_song_id = track_id
-            self.song_playing = is_playing
             self.updateSongLabel(item, is_playing)
 
             # Only refetch album/AI/similar on an actual track change - a
             # pause/resume of the same track shouldn't redo that work.
             if track_changed:
+                startup.mark("first_track")
+                self._cover_url = album_cover_url(item)
+                cached = self._cached_pixmap(self._cover_url)
+                if cached is not None:
+                    self.album_cover_label.setPixmap(cached)
                 self.ai_label.setText("AI Suggestions loading...")
                 self.similar_label.setText("Similar Tracks loading...")
                 self.start_worker(item)
+                self.prefetch_service.schedule()
 
         except Exception:
-            logger.exception("check_playback failed")
-            self.timer.setInterval(POLL_MS_IDLE)
-
-    def _next_interval(self, state, item, is_playing):
-        if not is_playing:
-            return POLL_MS_IDLE
-        duration_ms = item.get('duration_ms')
-        progress_ms = state.get('progress_ms')
-        if duration_ms is None or progress_ms is None:
-            return POLL_MS_ACTIVE
-        remaining_ms = duration_ms - progress_ms
-        return max(min(POLL_MS_ACTIVE, remaining_ms + 250), POLL_MS_MIN)
+            logger.exception("Failed to apply playback change")
 
     def _show_idle(self):
         self.song_name_label.setText("No song playing.")
@@ -232,49 +229,77 @@ class SpotifyApp(QWidget):
         self.artist_label.setText(f"{artist}" if is_playing else f"{artist} (Paused)")
 
     def start_worker(self, track):
-        # QThread.terminate() is unsafe if a worker is blocked in a network
-        # call, so a superseded worker is left to finish in the background;
-        # self._workers keeps it alive, and the sender checks below discard
-        # its results once it's no longer self.current_worker.
+        # A superseded job can't abort a network call already in flight, so
+        # it's cancelled instead: its unstarted stages are skipped and it
+        # stops emitting; the sender checks below are a second guard.
         try:
-            worker = FetchDataWorker(track, self.ai_service, self.similarity_service)
+            if self.current_worker is not None:
+                self.current_worker.cancel()
+            worker = FetchDataWorker(track, self.ai_service, self.similarity_service,
+                                     self.image_service, self._executor, self._local_executor)
             worker.album_bytes.connect(self.on_album_bytes)
+            worker.ai_progress.connect(self.on_ai_progress)
             worker.ai_ready.connect(self.on_ai_ready)
             worker.similar_ready.connect(self.on_similar_ready)
             worker.error.connect(self.on_worker_error)
-            worker.finished.connect(lambda: self._workers.remove(worker))
-            self._workers.append(worker)
             self.current_worker = worker
             worker.start()
         except Exception:
             logger.exception("Failed to start FetchDataWorker")
 
-    def on_album_bytes(self, data: bytes):
+    def on_album_bytes(self, url, data: bytes):
         if self.sender() is not self.current_worker:
             return
         try:
-            pixmap = QPixmap()
-            pixmap.loadFromData(data)
-            pixmap = pixmap.scaled(260, 260, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-
-            # Rounded pixmap
-            rounded = QPixmap(260, 260)
-            rounded.fill(QColor("transparent"))
-            painter = QPainter(rounded)
-            painter.setRenderHint(QPainter.Antialiasing)
-            painter.setBrush(QBrush(pixmap))
-            painter.setPen(Qt.NoPen)
-            painter.drawRoundedRect(0, 0, 260, 260, 8, 8)
-            painter.end()
+            rounded = self._cached_pixmap(url)
+            if rounded is None:
+                rounded = self._render_cover(data)
+                self._pixmap_cache[url] = rounded
+                while len(self._pixmap_cache) > config.PIXMAP_CACHE_SIZE:
+                    self._pixmap_cache.popitem(last=False)
 
             self.album_cover_label.setPixmap(rounded)
             self.album_cover_label.setVisible(True)
+            startup.mark("first_result")
         except Exception:
             logger.exception("Failed to render album image")
 
+    def _cached_pixmap(self, url):
+        pixmap = self._pixmap_cache.get(url)
+        if pixmap is not None:
+            self._pixmap_cache.move_to_end(url)
+        return pixmap
+
+    def _render_cover(self, data):
+        pixmap = QPixmap()
+        pixmap.loadFromData(data)
+        pixmap = pixmap.scaled(260, 260, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+        # Rounded pixmap
+        rounded = QPixmap(260, 260)
+        rounded.fill(QColor("transparent"))
+        painter = QPainter(rounded)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setBrush(QBrush(pixmap))
+        painter.setPen(Qt.NoPen)
+        painter.drawRoundedRect(0, 0, 260, 260, 8, 8)
+        painter.end()
+        return rounded
+
+    def on_ai_progress(self, chords):
+        if self.sender() is not self.current_worker:
+            return
+        try:
+            lines = chords[:3] + ["..."] * (3 - len(chords[:3]))
+            self.ai_label.setText("AI Chord Suggestions\n\n" + "\n".join(lines))
+            startup.mark("first_result")
+        except Exception:
+            logger.exception("Failed to update AI label")
+
     def on_ai_ready(self, chords):
         if self.sender() is not self.current_worker:
             return
+        startup.mark("first_result")  # an empty answer is a result too
         try:
             if not chords:
                 self.ai_label.setText("AI Chord Suggestions\n\n-\n-\n-")
@@ -288,6 +313,7 @@ class SpotifyApp(QWidget):
     def on_similar_ready(self, similar):
         if self.sender() is not self.current_worker:
             return
+        startup.mark("first_result")  # an empty answer is a result too
         try:
             if not similar:
                 self.similar_label.setText("Similar Tracks\n\nNot enough data\nfor this track")
@@ -300,19 +326,47 @@ class SpotifyApp(QWidget):
     def on_worker_error(self, msg):
         logger.error("Worker error: %s", msg)
 
+    def showEvent(self, event):
+        self.poller.set_visible(not self.isMinimized())
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.poller.set_visible(False)
+        super().hideEvent(event)
+
+    def changeEvent(self, event):
+        if event.type() == QEvent.WindowStateChange:
+            self.poller.set_visible(self.isVisible() and not self.isMinimized())
+        super().changeEvent(event)
+
+    def closeEvent(self, event):
+        self.poller.stop()
+        if self.current_worker is not None:
+            self.current_worker.cancel()
+        self._executor.shutdown(wait=False)
+        self._local_executor.shutdown(wait=False)
+        self.prefetch_service.shutdown()
+        # A poll already in flight can't be interrupted, and destroying a
+        # running QThread aborts the process, so hide and wait it out.
+        self.hide()
+        self.poller.wait()
+        if config.METRICS_EXPORT:
+            try:
+                metrics.export(config.METRICS_EXPORT)
+            except OSError:
+                logger.exception("Failed to export metrics to %s", config.METRICS_EXPORT)
+        super().closeEvent(event)
+
     def showFullScreenCover(self):
         try:
-            state = self.spotify_service.current_playback()
-            if not state:
+            # The current cover is already cached by the fetch job, so this
+            # doesn't touch the network on the GUI thread.
+            url = self._cover_url
+            if url is None:
                 return
-            track = state.get('item')
-            if not track:
+            data = self.image_service.cached(url)
+            if not data:
                 return
-            album_cover_url = track['album']['images'][0]['url']
-            import requests
-            resp = requests.get(album_cover_url, timeout=8)
-            resp.raise_for_status()
-            data = resp.content
             self.fullscreen_window = FullscreenImageWindow(data)
             self.fullscreen_window.show()
         except Exception:
@@ -1,26 +1,92 @@
-"""Configure structured logging for the application."""
+"""Configure structured logging for the application.
+
+Callers only pay for putting a record on a queue: a QueueHandler on the root
+logger hands records to a QueueListener thread, which formats them and does
+the console and file I/O. The log file rotates at config.LOG_MAX_BYTES and
+rotated files are gzip-compressed.
+
+Levels come from config: LOG_LEVEL for the root logger, and LOGGER_LEVELS
+per logger (by default spotipy, urllib3 and the OpenAI HTTP stack only log
+warnings). A record below its logger's level is never created, so noisy
+third-party debug output costs nothing unless it's turned on. Bearer tokens
+and OAuth token fields are redacted from whatever does get written.
+"""
+import atexit
+import gzip
 import logging
-from logging import StreamHandler, FileHandler, Formatter
+import os
+import queue
+import re
+import shutil
+from logging import StreamHandler, Formatter
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from .. import config
 
+_listener = None
+
+_SECRET_PATTERNS = [
+    (re.compile(r"(Bearer\s+)[A-Za-z0-9._~+/=-]+"), r"\1[REDACTED]"),
+    (re.compile(r"""(['"]?(?:access_token|refresh_token|client_secret|api_key)['"]?\s*[:=]\s*['"]?)[^'",\s}]+"""),
+     r"\1[REDACTED]"),
+]
+
+class RedactingFormatter(Formatter):
+    def format(self, record):
+        text = super().format(record)
+        for pattern, replacement in _SECRET_PATTERNS:
+            text = pattern.sub(replacement, text)
+        return text
+
+class _PassthroughQueueHandler(QueueHandler):
+    """Enqueue records as they are.
+
+    The stock prepare() formats the message and traceback on the logging
+    thread so the record can be pickled; our queue is in-process, so that's
+    left to the listener.
+    """
+    def prepare(self, record):
+        return record
+
+def _gzip_namer(name):
+    return name + ".gz"
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+def _parse_level(name):
+    level = logging.getLevelName(str(name).upper())
+    return level if isinstance(level, int) else logging.INFO
+
 def configure_logging():
+    global _listener
     root = logging.getLogger()
     if root.handlers:
         return  # already configured
 
-    root.setLevel(logging.DEBUG)
+    root.setLevel(_parse_level(config.LOG_LEVEL))
+    for name, level in config.LOGGER_LEVELS.items():
+        logging.getLogger(name).setLevel(_parse_level(level))
 
-    fmt = Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    fmt = RedactingFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
 
     ch = StreamHandler()
     ch.setLevel(logging.DEBUG)
     ch.setFormatter(fmt)
-    root.addHandler(ch)
 
-    fh = FileHandler(config.LOG_FILE)
+    fh = RotatingFileHandler(config.LOG_FILE, maxBytes=config.LOG_MAX_BYTES,
+                             backupCount=config.LOG_BACKUP_COUNT, encoding="utf-8", delay=True)
+    fh.namer = _gzip_namer
+    fh.rotator = _gzip_rotator
     fh.setLevel(logging.DEBUG)
     fh.setFormatter(fmt)
-    root.addHandler(fh)
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(_PassthroughQueueHandler(log_queue))
+    _listener = QueueListener(log_queue, ch, fh, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)  # drains queued records before exit
 
 # Auto-configure on import for convenience
 configure_logging()
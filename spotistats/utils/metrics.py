@@ -0,0 +1,179 @@
+"""Lightweight in-process timing spans, counters and latency histograms.
+
+    with metrics.span("worker.ai"):
+        ...
+    @metrics.timed("similarity.find_similar_many")
+    def find_similar_many(...): ...
+    metrics.incr("ai.cache_hits")
+
+Durations go into fixed log-spaced buckets (about 10us to 2 minutes, each 20%
+wider than the last), so memory is constant however long the app runs and
+p50/p95/p99 are accurate to a bucket width. snapshot() returns everything
+as a dict; export(path) writes it as JSON, or in Prometheus text format when
+the path ends in .prom (e.g. for a node_exporter textfile collector).
+
+Controlled by config.METRICS_ENABLED. When off, span() returns a shared
+no-op context manager and incr()/observe() return after one flag check, so
+the instrumentation can stay in hot paths.
+"""
+import bisect
+import functools
+import json
+import math
+import os
+import re
+import threading
+import time
+
+from .. import config
+
+_BOUNDS = [1e-5 * 1.2 ** i for i in range(90)]  # bucket upper bounds, seconds
+QUANTILES = (0.5, 0.95, 0.99)
+
+_enabled = config.METRICS_ENABLED
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+class _Histogram:
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(_BOUNDS) + 1)  # last bucket: above the top bound
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                upper = _BOUNDS[i] if i < len(_BOUNDS) else self.max
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        out = {"count": self.count, "sum": self.total,
+               "min": self.min if self.count else 0.0, "max": self.max}
+        for q in QUANTILES:
+            out[f"p{round(q * 100)}"] = self.quantile(q) if self.count else 0.0
+        return out
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start)
+        if exc_type is not None:
+            incr(self.name + ".errors")
+        return False
+
+def set_enabled(enabled):
+    global _enabled
+    _enabled = bool(enabled)
+
+def enabled():
+    return _enabled
+
+def span(name):
+    """Context manager timing its body into the `name` histogram (errors also counted)."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+def timed(name):
+    """Decorator form of span()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def observe(name, seconds):
+    if not _enabled:
+        return
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = _Histogram()
+        hist.add(seconds)
+
+def incr(name, n=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+def snapshot():
+    """{'counters': {name: n}, 'timings': {name: {count, sum, min, max, p50, p95, p99}}} in seconds."""
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "timings": {name: hist.summary() for name, hist in _histograms.items()},
+        }
+
+def _prom_name(name):
+    return "spotistats_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+def to_prometheus(snap=None):
+    snap = snap or snapshot()
+    lines = []
+    for name, value in sorted(snap["counters"].items()):
+        metric = _prom_name(name) + "_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    for name, summary in sorted(snap["timings"].items()):
+        metric = _prom_name(name) + "_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        for q in QUANTILES:
+            lines.append(f'{metric}{{quantile="{q}"}} {summary[f"p{round(q * 100)}"]:.6g}')
+        lines += [f"{metric}_sum {summary['sum']:.6g}", f"{metric}_count {summary['count']}"]
+    return "\n".join(lines) + "\n"
+
+def export(path):
+    """Write the current metrics to `path`: Prometheus text if it ends in .prom, else JSON.
+
+    Written to a temporary file and renamed, so a scraper never reads a partial file.
+    """
+    snap = snapshot()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        if path.endswith(".prom"):
+            f.write(to_prometheus(snap))
+        else:
+            json.dump(snap, f, indent=2)
+    os.replace(tmp_path, path)
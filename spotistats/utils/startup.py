@@ -0,0 +1,48 @@
+"""Startup timing: how long until the window is up, and until it shows a result.
+
+run.py calls begin() before its heavy imports; the window then marks
+milestones as they first happen:
+
+- window: first paint of the main window
+- first_track: the first playing track is shown
+- first_result: the first fetched result (cover, AI or similar tracks) is shown
+
+Each milestone is recorded once, in milliseconds since begin(), in the
+"startup.<name>" metrics histogram. A summary line is logged when
+first_result arrives; report() returns the same numbers as a dict.
+"""
+import logging
+import threading
+import time
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_start = time.perf_counter()  # fallback if begin() isn't called
+_marks = {}
+_lock = threading.Lock()
+
+def begin(start=None):
+    """Set time zero (a time.perf_counter() value, default now) for the milestones."""
+    global _start
+    _start = time.perf_counter() if start is None else start
+
+def mark(name):
+    """Record milestone `name` the first time it's reached; later calls are ignored."""
+    if name in _marks:
+        return
+    elapsed_ms = (time.perf_counter() - _start) * 1000
+    with _lock:
+        if name in _marks:
+            return
+        _marks[name] = elapsed_ms
+    metrics.observe("startup." + name, elapsed_ms / 1000)
+    logger.debug("Startup milestone %s after %.0f ms", name, elapsed_ms)
+    if name == "first_result":
+        logger.info("Startup: %s", ", ".join(f"{n} {ms:.0f} ms" for n, ms in report().items()))
+
+def report():
+    """{milestone: ms since begin()} for the milestones reached so far, in order."""
+    with _lock:
+        return dict(sorted(_marks.items(), key=lambda item: item[1]))
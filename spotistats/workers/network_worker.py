@@ -1,57 +1,166 @@
-"""Worker thread to fetch album image bytes, AI chord suggestions, and similar tracks.
+"""Per-track job to fetch album image bytes, AI chord suggestions, and similar tracks.
 Emits raw bytes for the UI thread to convert to QPixmap (QPixmap isn't thread-safe everywhere).
+
+The three stages are independent, so they run concurrently and each emits
+its signal as soon as it's done. The network stages (album, AI) share a
+fixed-size thread pool owned by the window (config.WORKER_THREADS threads);
+the similar-tracks lookup is local and runs on a separate executor, so it
+never queues behind network calls - not even ones left blocking by skipped
+tracks. The AI stage streams each chord progression (ai_progress) as it
+arrives. A stage still running config.WORKER_TIMEOUT seconds after it
+*started* gets its fallback emitted instead (the progressions streamed so
+far for AI, an empty list for similar, nothing for the album), and its late
+result is dropped; a stage still waiting for a thread is never timed out. A
+stage that finishes without a result gets the same fallback right away.
+
+Skipping tracks cancels the previous job: stages that haven't started yet are
+skipped, and results of ones already in flight are discarded. So the thread
+count and the number of wasted network calls stay bounded however fast the
+tracks change.
 """
 import logging
-from PyQt5.QtCore import QThread, pyqtSignal
-import requests
+import threading
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from .. import config
+from ..services.image_service import album_cover_url
+from ..utils import metrics
 
 logger = logging.getLogger(__name__)
 
-class FetchDataWorker(QThread):
-    album_bytes = pyqtSignal(bytes)
+class FetchDataWorker(QObject):
+    album_bytes = pyqtSignal(str, bytes)  # (image url, image bytes)
+    ai_progress = pyqtSignal(list)  # progressions streamed so far, before ai_ready
     ai_ready = pyqtSignal(list)
     similar_ready = pyqtSignal(list)
     error = pyqtSignal(str)
+    _stage_started = pyqtSignal(str)  # from a pool thread; arms that stage's timeout on the GUI thread
 
-    def __init__(self, spotify_track, ai_service, similarity_service, parent=None):
+    def __init__(self, spotify_track, ai_service, similarity_service, image_service=None,
+                 executor=None, local_executor=None, parent=None):
         super().__init__(parent)
         self.track = spotify_track
         self.ai_service = ai_service
         self.similarity_service = similarity_service
+        self.image_service = image_service
+        self.executor = executor
+        self.local_executor = local_executor or executor  # for the similar-tracks lookup
+        self._cancelled = threading.Event()
+        self._futures = []
+        self._settled = set()  # stages that have emitted (or timed out)
+        self._settled_lock = threading.Lock()
+        self._ai_partial = []
+        self._stage_started.connect(self._arm_timeout)
 
-    def run(self):
+    def start(self):
+        """Queue the stages on the executor. Call from the GUI thread."""
+        if not self.track:
+            return
         try:
-            if not self.track:
-                return
+            stages = [
+                ("similar", self._fetch_similar, self.local_executor),
+                ("album", self._fetch_album, self.executor),
+                ("ai", self._fetch_ai, self.executor),
+            ]
+            for name, fn, executor in stages:
+                self._futures.append(executor.submit(self._run_stage, name, fn))
+        except Exception as e:
+            logger.exception("Failed to start FetchDataWorker")
+            self.error.emit(str(e))
 
-            # Album art
-            try:
-                album_cover_url = self.track['album']['images'][0]['url']
-                resp = requests.get(album_cover_url, timeout=8)
-                resp.raise_for_status()
-                self.album_bytes.emit(resp.content)
-            except Exception:
-                logger.exception("Failed to fetch album image")
-
-            # AI suggestions
-            try:
-                if self.ai_service:
-                    track_name = self.track.get('name', 'Unknown')
-                    artist = ", ".join(a.get('name') for a in self.track.get('artists', []))
-                    chords = self.ai_service.get_chord_suggestions(track_name, artist)
-                    self.ai_ready.emit(chords)
-            except Exception:
-                logger.exception("Failed to fetch AI suggestions")
-
-            # Similar tracks
-            try:
-                if self.similarity_service:
-                    track_id = self.track.get('id')
-                    similar = self.similarity_service.find_similar(track_id, k=3)
-                    self.similar_ready.emit(similar)
-            except Exception:
-                logger.exception("Failed to fetch similar tracks")
+    def cancel(self):
+        """Mark this job stale: unstarted stages are skipped and no more signals are emitted."""
+        self._cancelled.set()
+        for future in self._futures:
+            future.cancel()
 
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def _run_stage(self, name, fn):
+        if self._cancelled.is_set():
+            metrics.incr("worker.stages_skipped")
+            return
+        self._stage_started.emit(name)
+        try:
+            with metrics.span(f"worker.{name}"):
+                fn()
         except Exception as e:
-            logger.exception("Unhandled error in FetchDataWorker")
+            logger.exception("Unhandled error in FetchDataWorker stage %r", name)
             self.error.emit(str(e))
+        finally:
+            # A stage that returned without emitting (no cover URL, a failed
+            # download or request) gets its fallback now, so the timeout only
+            # ever catches stages that are still running.
+            self._settle(name, self._fallback(name))
+
+    def _arm_timeout(self, name):
+        QTimer.singleShot(int(config.WORKER_TIMEOUT * 1000), lambda: self._on_timeout(name))
+
+    def _on_timeout(self, name):
+        if self._cancelled.is_set():
+            return
+        with self._settled_lock:
+            pending = name not in self._settled
+        if pending:
+            logger.warning("Stage %r timed out after %ss", name, config.WORKER_TIMEOUT)
+            metrics.incr(f"worker.{name}.timeouts")
+            self._settle(name, self._fallback(name))
+
+    def _settle(self, stage, emit):
+        """Run `emit` unless `stage` has already emitted (or timed out) or the job is stale."""
+        with self._settled_lock:
+            if stage in self._settled or self._cancelled.is_set():
+                return
+            self._settled.add(stage)
+        if emit is not None:
+            emit()
+
+    def _progress(self, stage, emit):
+        """Run `emit` (a partial result) only while `stage` is still pending and the job is live."""
+        with self._settled_lock:
+            if stage in self._settled or self._cancelled.is_set():
+                return
+        emit()
+
+    def _fallback(self, stage):
+        if stage == "ai":
+            partial = list(self._ai_partial)  # keep what streamed in before the timeout
+            return lambda: self.ai_ready.emit(partial)
+        if stage == "similar":
+            return lambda: self.similar_ready.emit([])
+        return None
+
+    def _fetch_album(self):
+        try:
+            url = album_cover_url(self.track)
+            if url and self.image_service:
+                data = self.image_service.get_image(url)
+                if data:
+                    self._settle("album", lambda: self.album_bytes.emit(url, data))
+        except Exception:
+            logger.exception("Failed to fetch album image")
+
+    def _fetch_ai(self):
+        try:
+            if self.ai_service:
+                track_name = self.track.get('name', 'Unknown')
+                artist = ", ".join(a.get('name') for a in self.track.get('artists', []))
+                chords = []
+                for chord in self.ai_service.stream_chord_suggestions(
+                        track_name, artist, self.track.get('id'), cancelled=self.is_cancelled):
+                    chords.append(chord)
+                    self._ai_partial = list(chords)
+                    self._progress("ai", lambda partial=list(chords): self.ai_progress.emit(partial))
+                self._settle("ai", lambda: self.ai_ready.emit(chords))
+        except Exception:
+            logger.exception("Failed to fetch AI suggestions")
+
+    def _fetch_similar(self):
+        try:
+            if self.similarity_service:
+                track_id = self.track.get('id')
+                similar = self.similarity_service.find_similar(track_id, k=3)
+                self._settle("similar", lambda: self.similar_ready.emit(similar))
+        except Exception:
+            logger.exception("Failed to fetch similar tracks")
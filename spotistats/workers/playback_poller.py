@@ -0,0 +1,138 @@
+"""Background thread that polls Spotify playback and reports changes to the UI.
+
+The playback round trip takes hundreds of milliseconds (and up to the full
+request timeout during network hiccups), so it must never run on the GUI
+thread. The poller owns the poll loop and its cadence, and emits signals
+only when something the UI shows has changed.
+
+Polls are kept rare and small. Each one hits the currently-playing endpoint
+with market=from_token (no device block, no available_markets lists), and
+between polls progress is extrapolated locally (services/playback_state.py).
+The next poll is scheduled for:
+
+- just after the predicted end of the playing track, or a POLL_MS_PLAYING
+  resync (catches manual pause/skip) if that comes first;
+- POLL_MS_AFTER_DRIFT when the last poll didn't match the prediction (the
+  user is seeking or skipping, so look again soon);
+- a backoff from POLL_MS_IDLE doubling up to POLL_MS_IDLE_MAX while paused
+  or idle and nothing changes;
+- all of the above stretched by HIDDEN_FACTOR (up to POLL_MS_HIDDEN_MAX)
+  while the window is hidden; showing it polls at once.
+"""
+import logging
+import threading
+import time
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from ..services.playback_state import PlaybackState
+from ..utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Poll cadence (ms). POLL_MS_PLAYING bounds how long a manual pause/skip on
+# another device takes to show up, so it stays at 5s; the savings while
+# playing come from the lighter endpoint, not from polling less often.
+POLL_MS_PLAYING = 5000
+POLL_MS_AFTER_DRIFT = 2000
+POLL_MS_IDLE = 4000
+POLL_MS_IDLE_MAX = 30000
+POLL_MS_MIN = 500
+POLL_MS_HIDDEN_MAX = 60000
+HIDDEN_FACTOR = 4
+TRACK_END_SLACK_MS = 250  # poll this long after the predicted end, once the next track has started
+DRIFT_MS = 1500  # prediction error beyond which playback was seeked, paused or stalled
+# Consecutive empty polls tolerated before treating playback as stopped, so a
+# single transient API hiccup doesn't flash the UI to "No song playing."
+IDLE_GRACE_POLLS = 3
+
+class PlaybackPoller(QThread):
+    # (item, is_playing, track_changed) - emitted when the track or play state changes
+    playback_changed = pyqtSignal(dict, bool, bool)
+    playback_stopped = pyqtSignal()
+
+    def __init__(self, spotify_service, parent=None):
+        super().__init__(parent)
+        self.spotify_service = spotify_service
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self.state = None  # last PlaybackState observed
+        self.last_song_id = None
+        self.song_playing = False
+        self.visible = True
+        self._idle_streak = 0
+        self._unchanged_idle_polls = 0
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def poll_now(self):
+        """Cut the current wait short and poll immediately."""
+        self._wake.set()
+
+    def set_visible(self, visible):
+        """Slow polling down while the window is hidden; resync as soon as it's shown."""
+        was_visible, self.visible = self.visible, visible
+        if visible and not was_visible:
+            self.poll_now()
+
+    def run(self):
+        while not self._stop.is_set():
+            interval_ms = self.poll_once()
+            self._wake.wait(interval_ms / 1000)
+            self._wake.clear()
+
+    @metrics.timed("playback.poll")
+    def poll_once(self):
+        """Poll once, emit any change, and return the wait (ms) before the next poll."""
+        try:
+            payload = self.spotify_service.currently_playing()
+            state = PlaybackState.from_payload(payload)
+
+            if state is None:
+                self._idle_streak += 1
+                if self._idle_streak >= IDLE_GRACE_POLLS and self.last_song_id is not None:
+                    self.last_song_id = None
+                    self.song_playing = False
+                    self.state = None
+                    self.playback_stopped.emit()
+                return self._scaled(self._idle_interval(changed=False))
+
+            self._idle_streak = 0
+            track_changed = state.track_id != self.last_song_id
+            play_changed = state.is_playing != self.song_playing
+            drifted = (not track_changed and self.state is not None
+                       and self.state.drift_ms(state) > DRIFT_MS)
+            self.state = state
+
+            if track_changed or play_changed:
+                self.last_song_id = state.track_id
+                self.song_playing = state.is_playing
+                self.playback_changed.emit(state.item, state.is_playing, track_changed)
+
+            if not state.is_playing:
+                return self._scaled(self._idle_interval(changed=track_changed or play_changed))
+            self._unchanged_idle_polls = 0
+            return self._scaled(self._playing_interval(state, drifted))
+        except Exception:
+            logger.exception("Playback poll failed")
+            return self._scaled(POLL_MS_IDLE)
+
+    def _playing_interval(self, state, drifted):
+        interval = POLL_MS_AFTER_DRIFT if drifted else POLL_MS_PLAYING
+        remaining_ms = state.remaining_ms(time.monotonic())
+        if remaining_ms is not None:
+            interval = min(interval, remaining_ms + TRACK_END_SLACK_MS)
+        return max(interval, POLL_MS_MIN)
+
+    def _idle_interval(self, changed):
+        if changed:
+            self._unchanged_idle_polls = 0
+        interval = min(POLL_MS_IDLE * 2 ** self._unchanged_idle_polls, POLL_MS_IDLE_MAX)
+        self._unchanged_idle_polls = min(self._unchanged_idle_polls + 1, 16)
+        return interval
+
+    def _scaled(self, interval_ms):
+        if self.visible:
+            return interval_ms
+        return min(interval_ms * HIDDEN_FACTOR, POLL_MS_HIDDEN_MAX)